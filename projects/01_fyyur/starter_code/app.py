@@ -8,7 +8,10 @@ from flask import (Flask,
                    flash,
                    redirect,
                    url_for,
-                   abort)
+                   abort,
+                   jsonify,
+                   Response)
+from flask.json import JSONEncoder as FlaskJSONEncoder
 from flask_moment import Moment
 
 from flask_migrate import Migrate, MigrateCommand
@@ -17,12 +20,13 @@ import logging
 from logging import (Formatter,
                      FileHandler)
 import regex as re
-from datetime import datetime
-import dateutil.parser
-import babel
+import sys
+from datetime import (datetime,
+                      timedelta)
 from forms import (ShowForm,
                    VenueForm,
                    ArtistForm)
+from filters import format_datetime
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -36,34 +40,95 @@ app.config.update(SESSION_COOKIE_SECURE=True,
                   SESSION_COOKIE_SAMESITE='Lax')
 
 from models import (db,
-                    Genre,
                     Venue,
                     Artist,
-                    Show)
+                    Show,
+                    venue_genre_table)
+from queries import (venue_directory,
+                     venue_timeline,
+                     artist_timeline,
+                     artists_page,
+                     shows_page)
+from routing import read_only
+from genres import resolve_genres
+from schedule import (calendar,
+                      find_conflict)
+from search import (find_venues,
+                    find_artists)
+from etags import (conditional_json,
+                   venue_version,
+                   artist_version,
+                   venues_version,
+                   artists_version,
+                   shows_version)
+from cache import (PageCache,
+                   cached_page)
+from metrics import RequestMetrics
+from importer import ImportCommand
+from explain import ExplainCommand
+from stats import (StatsCommand,
+                   record_new_show,
+                   discard_shows)
 
 migrate = Migrate(app, db)
 
 manager = Manager(app)
 manager.add_command('db', MigrateCommand)
+manager.add_command('import', ImportCommand())
+manager.add_command('explain', ExplainCommand())
+manager.add_command('stats', StatsCommand)
+
+page_cache = PageCache(max_entries=app.config.get('PAGE_CACHE_SIZE'),
+                       ttl=app.config.get('PAGE_CACHE_TTL'))
+
+request_metrics = RequestMetrics(app, slow_request_threshold=app.config.get('SLOW_REQUEST_THRESHOLD'))
 
 #----------------------------------------------------------------------------#
 # Filter.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
+app.jinja_env.filters['datetime'] = format_datetime
 
-    date = dateutil.parser.parse(value)
+class JSONEncoder(FlaskJSONEncoder):
 
-    if format == 'full':
-        format="EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format="EE MM, dd, y h:mma"
+    # ISO 8601 like the calendar, instead of Flask's HTTP date format
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
 
-    return babel.dates.format_datetime(date,
-                                       format,
-                                       locale='en')
+app.json_encoder = JSONEncoder
 
-app.jinja_env.filters['datetime'] = format_datetime
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+def invalidate_venue_page(venue_id):
+
+    # artist pages list the venues they play at, so they go stale as well
+    artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+
+    page_cache.invalidate(('venue', int(venue_id)),
+                          *[('artist', row.artist_id) for row in artist_ids])
+
+def invalidate_artist_page(artist_id):
+
+    venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+
+    page_cache.invalidate(('artist', int(artist_id)),
+                          *[('venue', row.venue_id) for row in venue_ids])
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(page_cache.stats())
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+@app.route('/metrics')
+def metrics():
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -77,78 +142,36 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@read_only
 def venues():
 
-    areas = db.session.query(Venue.city,
-                             Venue.state).distinct(Venue.city,
-                                                   Venue.state).order_by('state').all()
-    data = []
-
-    for area in areas:
-        venues = Venue.query.filter_by(state=area.state).filter_by(city=area.city).order_by('name').all()
-        venue_data = []
-        data.append({'city': area.city,
-                     'state': area.state,
-                     'venues': venue_data})
-
-        for venue in venues:
-            shows = Show.query.filter_by(venue_id=venue.id).order_by('id').all()
-            venue_data.append({'id': venue.id,
-                               'name': venue.name,
-                               'num_upcoming_shows': len(shows)})
+    data = venue_directory()
 
     return render_template('pages/venues.html',
                            areas=data)
 
 @app.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
 
     search_term = request.form.get('search_term', '')
-    result = db.session.query(Venue).filter(Venue.name.ilike(f'%{search_term}%')).all()
-    count = len(result)
-    response = {"count": count,
-                "data": result}
+    response = find_venues(search_term,
+                           page=request.form.get('page', 1, type=int),
+                           per_page=app.config.get('SEARCH_RESULTS_PER_PAGE'))
 
     return render_template('pages/search_venues.html',
                            results=response,
-                           search_term=request.form.get('search_term', ''))
+                           search_term=search_term)
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
+def venue_data(venue_id):
 
     venue = Venue.query.filter(Venue.id == venue_id).first()
 
-    past = db.session.query(Show).filter(Show.venue_id == venue_id).filter(
-        Show.start_time < datetime.now()).join(Artist,
-                                               Show.artist_id == Artist.id).add_columns(Artist.id,
-                                                                                        Artist.name,
-                                                                                        Artist.image_link,
-                                                                                        Show.start_time).all()
-
-    upcoming = db.session.query(Show).filter(Show.venue_id == venue_id).filter(
-        Show.start_time > datetime.now()).join(Artist,
-                                               Show.artist_id == Artist.id).add_columns(Artist.id,
-                                                                                        Artist.name,
-                                                                                        Artist.image_link,
-                                                                                        Show.start_time).all()
-
-    upcoming_shows = []
-    past_shows = []
-
-    for i in upcoming:
-        upcoming_shows.append({'artist_id': i[1],
-                               'artist_name': i[2],
-                               'artist_image_link': i[3],
-                               'start_time': str(i[4])})
-
-    for i in past:
-        past_shows.append({'artist_id': i[1],
-                           'artist_name': i[2],
-                           'artist_image_link': i[3],
-                           'start_time': str(i[4])})
-
     if venue is None:
-        abort(404)
+        return None
+
+    timeline = venue_timeline(venue_id,
+                              limit=app.config.get('SHOW_TIMELINE_LIMIT'))
 
     genres = [genre.name for genre in venue.genres]
 
@@ -164,10 +187,20 @@ def show_venue(venue_id):
                 "seeking_talent": venue.seeking_talent,
                 "seeking_description": venue.seeking_description,
                 "image_link": venue.image_link,
-                "past_shows": past_shows,
-                "upcoming_shows": upcoming_shows,
-                "past_shows_count": len(past),
-                "upcoming_shows_count": len(upcoming)}
+                **timeline}
+
+    return response
+
+# no @read_only: misses refill the page cache right after an invalidation,
+# and a lagging replica would keep a stale page there for the whole TTL
+@app.route('/venues/<int:venue_id>')
+@cached_page(page_cache, 'venue')
+def show_venue(venue_id):
+
+    response = venue_data(venue_id)
+
+    if response is None:
+        abort(404)
 
     return render_template('pages/show_venue.html',
                            venue=response)
@@ -219,14 +252,7 @@ def create_venue_submission():
                               image_link=image_link,
                               website=website,
                               facebook_link=facebook_link)
-            for genre in genres:
-                fetch_genre = Genre.query.filter_by(name=genre).one_or_none()
-                if fetch_genre:
-                    new_venue.genres.append(fetch_genre)
-                else:
-                    new_genre = Genre(name=genre)
-                    db.session.add(new_genre)
-                    new_venue.genres.append(new_genre)
+            new_venue.genres = resolve_genres(genres)
 
             db.session.add(new_venue)
             db.session.commit()
@@ -250,8 +276,12 @@ def create_venue_submission():
 def delete_venue(venue_id):
 
     try:
+        owners = discard_shows(Show.venue_id == venue_id)
+        db.session.execute(venue_genre_table.delete().where(venue_genre_table.c.venue_id == venue_id))
         Venue.query.filter(Venue.id == venue_id).delete()
         db.session.commit()
+        page_cache.invalidate(('venue', int(venue_id)),
+                              *[('artist', artist_id) for artist_id in owners[Artist]])
     except:
         db.session.rollback()
     finally:
@@ -263,74 +293,61 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 
 @app.route('/artists')
+@read_only
 def artists():
 
-    response = Artist.query.all()
+    response, next_cursor = artists_page(request.args.get('after'),
+                                         per_page=app.config.get('LISTING_PAGE_SIZE'))
 
     return render_template('pages/artists.html',
-                           artists=response)
+                           artists=response,
+                           next_cursor=next_cursor)
 
 @app.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
 
     search_term = request.form.get('search_term', '')
-
-    result = db.session.query(Artist).filter(Artist.name.ilike(f'%{search_term}%')).all()
-    count = len(result)
-
-    response = {"count": count,
-                "data": result}
+    response = find_artists(search_term,
+                            page=request.form.get('page', 1, type=int),
+                            per_page=app.config.get('SEARCH_RESULTS_PER_PAGE'))
 
     return render_template('pages/search_artists.html',
                            results=response,
                            search_term=search_term)
 
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
+def artist_data(artist_id):
 
     artist = Artist.query.get(artist_id)
-    print(artist)
 
     if not artist:
+        return None
+
+    genres = [genre.name for genre in artist.genres]
+    timeline = artist_timeline(artist_id,
+                               limit=app.config.get('SHOW_TIMELINE_LIMIT'))
+
+    return {"id": artist_id,
+            "name": artist.name,
+            "genres": genres,
+            "city": artist.city,
+            "state": artist.state,
+            "phone": (artist.phone[:3] + '-' + artist.phone[3:6] + '-' + artist.phone[6:]),
+            "website": artist.website,
+            "facebook_link": artist.facebook_link,
+            "seeking_venue": artist.seeking_venue,
+            "seeking_description": artist.seeking_description,
+            "image_link": artist.image_link,
+            **timeline}
+
+@app.route('/artists/<int:artist_id>')
+@cached_page(page_cache, 'artist')
+def show_artist(artist_id):
+
+    response = artist_data(artist_id)
+
+    if response is None:
         return redirect(url_for('index'))
-    else:
-        genres = [genre.name for genre in artist.genres]
-        past_shows = []
-        past_shows_count = 0
-        upcoming_shows = []
-        upcoming_shows_count = 0
-        now = datetime.now()
-
-        for show in artist.shows:
-            if show.start_time > now:
-                upcoming_shows_count += 1
-                upcoming_shows.append({"venue_id": show.venue_id,
-                                       "venue_name": show.venue.name,
-                                       "venue_image_link": show.venue.image_link,
-                                       "start_time": format_datetime(str(show.start_time))})
-
-            if show.start_time < now:
-                past_shows_count += 1
-                past_shows.append({"venue_id": show.venue_id,
-                                   "venue_name": show.venue.name,
-                                   "venue_image_link": show.venue.image_link,
-                                   "start_time": format_datetime(str(show.start_time))})
-
-        response = {"id": artist_id,
-                    "name": artist.name,
-                    "genres": genres,
-                    "city": artist.city,
-                    "state": artist.state,
-                    "phone": (artist.phone[:3] + '-' + artist.phone[3:6] + '-' + artist.phone[6:]),
-                    "website": artist.website,
-                    "facebook_link": artist.facebook_link,
-                    "seeking_venue": artist.seeking_venue,
-                    "seeking_description": artist.seeking_description,
-                    "image_link": artist.image_link,
-                    "past_shows": past_shows,
-                    "past_shows_count": past_shows_count,
-                    "upcoming_shows": upcoming_shows,
-                    "upcoming_shows_count": upcoming_shows_count}
 
     return render_template('pages/show_artist.html',
                            artist=response)
@@ -403,16 +420,7 @@ def edit_artist_submission(artist_id):
             artist.website = website
             artist.facebook_link = facebook_link
 
-            artist.genres.clear()
-
-            for genre in genres:
-                fetch_genre = Genre.query.filter_by(name=genre).one_or_none()
-                if fetch_genre:
-                    artist.genres.append(fetch_genre)
-                else:
-                    new_genre = Genre(name=genre)
-                    db.session.add(new_genre)
-                    artist.genres.append(new_genre)
+            artist.genres = resolve_genres(genres)
 
             db.session.commit()
 
@@ -425,6 +433,7 @@ def edit_artist_submission(artist_id):
             db.session.close()
 
         if not error_in_update:
+            invalidate_artist_page(artist_id)
             flash('Artist ' + request.form['name'] + ' was successfully updated!')
             return redirect(url_for('show_artist',
                                     artist_id=artist_id))
@@ -501,17 +510,7 @@ def edit_venue_submission(venue_id):
             venue.website = website
             venue.facebook_link = facebook_link
 
-            venue.genres.clear()
-
-            for genre in genres:
-                fetch_genre = Genre.query.filter_by(name=genre).one_or_none()
-
-                if fetch_genre:
-                    venue.genres.append(fetch_genre)
-                else:
-                    new_genre = Genre(name=genre)
-                    db.session.add(new_genre)
-                    venue.genres.append(new_genre)
+            venue.genres = resolve_genres(genres)
 
             db.session.commit()
 
@@ -524,6 +523,7 @@ def edit_venue_submission(venue_id):
             db.session.close()
 
         if not error_in_update:
+            invalidate_venue_page(venue_id)
             flash('Venue ' + request.form['name'] + ' was successfully updated!')
             return redirect(url_for('show_venue',
                                     venue_id=venue_id))
@@ -577,14 +577,7 @@ def create_artist_submission():
                                 website=website,
                                 facebook_link=facebook_link)
 
-            for genre in genres:
-                fetch_genre = Genre.query.filter_by(name=genre).one_or_none()
-                if fetch_genre:
-                    new_artist.genres.append(fetch_genre)
-                else:
-                    new_genre = Genre(name=genre)
-                    db.session.add(new_genre)
-                    new_artist.genres.append(new_genre)
+            new_artist.genres = resolve_genres(genres)
 
             db.session.add(new_artist)
             db.session.commit()
@@ -609,11 +602,11 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
-def shows():
+def shows_data(cursor):
 
     data = []
-    shows = Show.query.all()
+    shows, next_cursor = shows_page(cursor,
+                                    per_page=app.config.get('LISTING_PAGE_SIZE'))
 
     for show in shows:
         data.append({"venue_id": show.venue.id,
@@ -621,10 +614,19 @@ def shows():
                      "artist_id": show.artist.id,
                      "artist_name": show.artist.name,
                      "artist_image_link": show.artist.image_link,
-                     "start_time": format_datetime(str(show.start_time))})
+                     "start_time": show.start_time})
+
+    return data, next_cursor
+
+@app.route('/shows')
+@read_only
+def shows():
+
+    data, next_cursor = shows_data(request.args.get('after'))
 
     return render_template('pages/shows.html',
-                           shows=data)
+                           shows=data,
+                           next_cursor=next_cursor)
 
 @app.route('/shows/create')
 def create_shows():
@@ -642,15 +644,28 @@ def create_show_submission():
     start_time = form.start_time.data
 
     error_in_insert = False
+    conflict = None
 
     try:
         new_show = Show(start_time=start_time,
                         artist_id=artist_id,
                         venue_id=venue_id)
-        db.session.add(new_show)
-        db.session.commit()
 
-    except:
+        # bumping the statistics locks the venue and artist rows first, so a
+        # concurrent booking of either waits here and then sees this show
+        record_new_show(new_show)
+        conflict = find_conflict(venue_id,
+                                 artist_id,
+                                 start_time,
+                                 timedelta(minutes=app.config.get('SHOW_SLOT_MINUTES')))
+
+        if conflict:
+            db.session.rollback()
+        else:
+            db.session.add(new_show)
+            db.session.commit()
+
+    except Exception as e:
         error_in_insert = True
         print(f'Exception "{e}" in create_show_submission()')
         db.session.rollback()
@@ -662,11 +677,89 @@ def create_show_submission():
         flash(f'An error occurred.  Show could not be listed.')
         print("Error in create_show_submission()")
 
+    elif conflict:
+        booked = 'The venue' if conflict.venue_id == int(venue_id) else 'The artist'
+        flash(f'{booked} already has a show at {conflict.start_time:%Y-%m-%d %H:%M}. '
+              f'Show could not be listed.')
+
     else:
+        page_cache.invalidate(('venue', int(venue_id)),
+                              ('artist', int(artist_id)))
         flash('Show was successfully listed!')
 
     return render_template('pages/home.html')
 
+#  JSON API
+#  ----------------------------------------------------------------
+
+@app.route('/api/venues')
+@read_only
+@conditional_json(venues_version)
+def api_venues():
+    return {'areas': venue_directory()}
+
+@app.route('/api/venues/<int:venue_id>')
+@read_only
+@conditional_json(venue_version)
+def api_venue(venue_id):
+    return venue_data(venue_id)
+
+@app.route('/api/artists')
+@read_only
+@conditional_json(artists_version)
+def api_artists():
+
+    artists, next_cursor = artists_page(request.args.get('after'),
+                                        per_page=app.config.get('LISTING_PAGE_SIZE'))
+
+    return {'artists': [{'id': artist.id,
+                         'name': artist.name} for artist in artists],
+            'next_cursor': next_cursor}
+
+@app.route('/api/artists/<int:artist_id>')
+@read_only
+@conditional_json(artist_version)
+def api_artist(artist_id):
+    return artist_data(artist_id)
+
+@app.route('/api/shows')
+@read_only
+@conditional_json(shows_version)
+def api_shows():
+
+    data, next_cursor = shows_data(request.args.get('after'))
+
+    return {'shows': data,
+            'next_cursor': next_cursor}
+
+#  Calendar
+#  ----------------------------------------------------------------
+
+@app.route('/calendar')
+@read_only
+def show_calendar():
+
+    # /calendar?start=2021-05-01&end=2021-06-01 with an optional venue_id,
+    # artist_id, city and/or state
+    try:
+        start = datetime.fromisoformat(request.args['start'])
+        end = datetime.fromisoformat(request.args['end'])
+    except (KeyError, ValueError):
+        abort(400)
+
+    shows, truncated = calendar(start,
+                                end,
+                                venue_id=request.args.get('venue_id', type=int),
+                                artist_id=request.args.get('artist_id', type=int),
+                                city=request.args.get('city'),
+                                state=request.args.get('state'),
+                                limit=app.config.get('CALENDAR_MAX_SHOWS'))
+
+    return jsonify({'start': start.isoformat(),
+                    'end': end.isoformat(),
+                    'shows': shows,
+                    'truncated': truncated})
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -689,6 +782,9 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
-    #manager.run()
+    # "python app.py import --venues venues.csv ..." runs a manager command
+    if len(sys.argv) > 1:
+        manager.run()
+    else:
+        app.run()
 
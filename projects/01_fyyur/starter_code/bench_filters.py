@@ -0,0 +1,67 @@
+#----------------------------------------------------------------------------#
+# Micro-benchmark for the `datetime` Jinja filter.
+#
+#   python bench_filters.py [rows]
+#
+# Formats the start times of a /shows page worth of rows with the original
+# string round-trip implementation and with filters.format_datetime.
+#----------------------------------------------------------------------------#
+
+import random
+import sys
+import timeit
+from datetime import (datetime,
+                      timedelta)
+import babel.dates
+import dateutil.parser
+from filters import (format_datetime,
+                     _format_datetime)
+
+def legacy_format_datetime(value, format='medium'):
+
+    date = dateutil.parser.parse(value)
+
+    if format == 'full':
+        format="EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format="EE MM, dd, y h:mma"
+
+    return babel.dates.format_datetime(date,
+                                       format,
+                                       locale='en')
+
+def main(rows=500, repeat=5):
+
+    random.seed(0)
+    now = datetime.now().replace(microsecond=0)
+    # a listing page shows each start time once, but the same times recur
+    # across requests, which is what the memo is for
+    start_times = [now + timedelta(hours=random.randint(-5000, 5000)) for _ in range(rows)]
+
+    for start_time in start_times:
+        assert format_datetime(start_time, 'full') == legacy_format_datetime(str(start_time), 'full')
+
+    def legacy():
+        for start_time in start_times:
+            legacy_format_datetime(str(start_time), 'full')
+
+    def cold():
+        _format_datetime.cache_clear()
+        for start_time in start_times:
+            format_datetime(start_time, 'full')
+
+    def warm():
+        for start_time in start_times:
+            format_datetime(start_time, 'full')
+
+    results = {}
+
+    for name, run in (('legacy', legacy), ('compiled', cold), ('memoized', warm)):
+        results[name] = min(timeit.repeat(run, number=1, repeat=repeat)) / rows
+
+    for name, seconds in results.items():
+        print(f'{name:>10}: {seconds * 1e6:8.2f} us/call  '
+              f'{results["legacy"] / seconds:6.1f}x')
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -8,13 +8,56 @@ DB_HOST = os.environ.get('DB_HOST')
 DB_USR = os.environ.get('DB_USR')
 DB_PASSWD = os.environ.get('DB_PASSWD')
 
-if not all([DB_HOST, DB_USR, DB_PASSWD]):
+# a full URL, e.g. sqlite:///primary.db, replaces the three variables above
+DATABASE_URL = os.environ.get('DATABASE_URL')
+
+if not DATABASE_URL and not all([DB_HOST, DB_USR, DB_PASSWD]):
    raise Exception('Missing database environment variables!')
 
 DB_URL = 'postgres://{}:{}@{}/udacityFyyur'
 
-SQLALCHEMY_DATABASE_URI = DB_URL.format(DB_USR, DB_PASSWD, DB_HOST)
+SQLALCHEMY_DATABASE_URI = DATABASE_URL or DB_URL.format(DB_USR, DB_PASSWD, DB_HOST)
+
+# comma separated; read-only views spread their SELECTs over these
+DB_REPLICA_URLS = [url.strip() for url in os.environ.get('DB_REPLICA_URLS', '').split(',') if url.strip()]
+
+SQLALCHEMY_BINDS = {f'replica_{number}': url for number, url in enumerate(DB_REPLICA_URLS)}
+
+# how long a client that wrote keeps reading from the primary
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+# applied to the primary and every replica; pool_size, max_overflow and
+# pool_timeout are only passed when set because SQLite file databases
+# run without a queue pool
+SQLALCHEMY_ENGINE_OPTIONS = {'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+                             'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800))}
+
+for option, variable in (('pool_size', 'DB_POOL_SIZE'),
+                         ('max_overflow', 'DB_MAX_OVERFLOW'),
+                         ('pool_timeout', 'DB_POOL_TIMEOUT')):
+    if variable in os.environ:
+        SQLALCHEMY_ENGINE_OPTIONS[option] = int(os.environ[variable])
 
 DEBUG = True
 
+# upper bound on the past and upcoming shows listed on a venue/artist page
+SHOW_TIMELINE_LIMIT = int(os.environ.get('SHOW_TIMELINE_LIMIT', 50))
+
+SEARCH_RESULTS_PER_PAGE = int(os.environ.get('SEARCH_RESULTS_PER_PAGE', 20))
+
+LISTING_PAGE_SIZE = int(os.environ.get('LISTING_PAGE_SIZE', 50))
+
+# minimum gap between two shows at the same venue or by the same artist
+SHOW_SLOT_MINUTES = int(os.environ.get('SHOW_SLOT_MINUTES', 180))
+
+CALENDAR_MAX_SHOWS = int(os.environ.get('CALENDAR_MAX_SHOWS', 1000))
+
+# rendered venue/artist detail pages; entries are dropped on edits, deletes
+# and new shows, the TTL only moves shows from upcoming to past
+PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 1024))
+PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 60))
+
+# seconds; requests slower than this are logged with their SQL statements
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 0)) or None
+
 SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -0,0 +1,107 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import (abort,
+                   current_app,
+                   jsonify,
+                   request)
+from sqlalchemy import event
+from models import (db,
+                    Venue,
+                    Artist,
+                    Show)
+
+#----------------------------------------------------------------------------#
+# Row versions.
+#
+# Venue.version and Artist.version go up with every UPDATE of their row,
+# including the statistics updates issued for new and deleted shows.
+# Shows are never edited, so a set of shows is versioned by its count and
+# highest id.
+#----------------------------------------------------------------------------#
+
+def bump_versions(session, flush_context, instances):
+
+    # changing only the genres does not UPDATE the row itself
+    for obj in session.dirty:
+        if isinstance(obj, (Venue, Artist)) and session.is_modified(obj):
+            obj.version = type(obj).version + 1
+
+event.listen(db.session, 'before_flush', bump_versions)
+
+def _table_version(model):
+
+    # sum() rises with every bump, count() and max(id) catch inserts and deletes
+    return db.session.query(db.func.count(model.id),
+                            db.func.max(model.id),
+                            db.func.sum(model.version)).one()
+
+def _owner_version(model, show_column, counterpart, counterpart_column, owner_id, now):
+
+    # one aggregate over the owner's shows instead of loading the timeline
+    return db.session.query(model.version,
+                            db.func.count(Show.id),
+                            db.func.max(Show.id),
+                            db.func.count(Show.id).filter(Show.start_time > now),
+                            db.func.sum(counterpart.version)).outerjoin(
+                                Show, show_column == model.id).outerjoin(
+                                counterpart, counterpart_column == counterpart.id).filter(
+                                model.id == owner_id).group_by(model.id).first()
+
+def venue_version(venue_id):
+
+    return _owner_version(Venue, Show.venue_id, Artist, Show.artist_id, venue_id, datetime.now())
+
+def artist_version(artist_id):
+
+    return _owner_version(Artist, Show.artist_id, Venue, Show.venue_id, artist_id, datetime.now())
+
+def venues_version():
+
+    return tuple(_table_version(Venue))
+
+def artists_version():
+
+    return tuple(_table_version(Artist))
+
+def shows_version():
+
+    # listed shows carry venue and artist names
+    return tuple(_table_version(Venue)) + tuple(_table_version(Artist)) + tuple(
+        db.session.query(db.func.count(Show.id), db.func.max(Show.id)).one())
+
+#----------------------------------------------------------------------------#
+# Conditional responses.
+#----------------------------------------------------------------------------#
+
+def make_etag(*parts):
+
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def conditional_json(version):
+
+    # the version is read before the body is built, so a concurrent change
+    # can only make the ETag older than the body, never newer
+    def decorator(view):
+
+        @wraps(view)
+        def wrapper(**kwargs):
+            parts = version(**kwargs)
+
+            if parts is None:
+                abort(404)
+
+            etag = make_etag(request.full_path, *parts)
+
+            if etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+            else:
+                response = jsonify(view(**kwargs))
+
+            response.set_etag(etag)
+
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,116 @@
+from flask import current_app
+from flask_script import Command
+from sqlalchemy import event
+from models import (db,
+                    Venue,
+                    Artist)
+
+#----------------------------------------------------------------------------#
+# Index usage check.
+#----------------------------------------------------------------------------#
+
+# view -> indexes its plans may use; at least one of them has to show up
+# and none of the statements may fall back to a sequential scan
+EXPECTED_INDEXES = (('venues', 'GET', '/venues', {},
+                     ('ix_Venue_state_city_name',)),
+                    ('show_venue', 'GET', '/venues/{venue_id}', {},
+                     ('ix_Show_venue_id_start_time',)),
+                    ('show_artist', 'GET', '/artists/{artist_id}', {},
+                     ('ix_Show_artist_id_start_time',)),
+                    ('artists', 'GET', '/artists', {},
+                     ('ix_Artist_name_id',)),
+                    ('shows', 'GET', '/shows', {},
+                     ('ix_Show_start_time_id',)),
+                    ('search_venues', 'POST', '/venues/search', {'search_term': 'fyyur'},
+                     ('ix_Venue_name_tsv',)),
+                    ('search_artists', 'POST', '/artists/search', {'search_term': 'fyyur'},
+                     ('ix_Artist_name_tsv',)),
+                    ('calendar_venue', 'GET', '/calendar?venue_id={venue_id}&start=2000-01-01&end=2100-01-01', {},
+                     ('ix_Show_venue_id_start_time',)),
+                    ('calendar_artist', 'GET', '/calendar?artist_id={artist_id}&start=2000-01-01&end=2100-01-01', {},
+                     ('ix_Show_artist_id_start_time',)),
+                    ('calendar', 'GET', '/calendar?start=2021-01-01&end=2021-01-02', {},
+                     ('ix_Show_start_time_id',)))
+
+def engines():
+
+    # @read_only views send their SELECTs to the replicas
+    app = current_app._get_current_object()
+
+    return [db.engine] + [db.get_engine(app, bind=replica) for replica in db.replicas(app)]
+
+def capture_statements(client, method, path, data):
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((conn.engine, statement, parameters))
+
+    for engine in engines():
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+
+    try:
+        client.open(path, method=method, data=data)
+    finally:
+        for engine in engines():
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    return statements
+
+def explain(statements):
+
+    plans = []
+
+    # explained where they ran; a replica's plans can differ from the primary's
+    for engine in {engine for engine, _, _ in statements}:
+        connection = engine.raw_connection()
+
+        try:
+            cursor = connection.cursor()
+            # small development databases make sequential scans look cheaper than
+            # any index; the check is about whether the planner *can* use them
+            cursor.execute('SET enable_seqscan = off')
+
+            for statement_engine, statement, parameters in statements:
+                if statement_engine is engine:
+                    cursor.execute('EXPLAIN ' + statement, parameters)
+                    plans.append('\n'.join(row[0] for row in cursor.fetchall()))
+        finally:
+            connection.rollback()
+            connection.close()
+
+    return plans
+
+def check_index_usage():
+
+    app = current_app._get_current_object()
+    client = app.test_client()
+    ids = {'venue_id': db.session.query(Venue.id).limit(1).scalar() or 1,
+           'artist_id': db.session.query(Artist.id).limit(1).scalar() or 1}
+    failures = 0
+
+    for view, method, path, data, indexes in EXPECTED_INDEXES:
+        plans = '\n'.join(explain(capture_statements(client, method, path.format(**ids), data)))
+        used = [index for index in indexes if f'"{index}"' in plans]
+        scans = sorted(set(line.split(' on ')[1].split()[0] for line in plans.splitlines()
+                           if 'Seq Scan on ' in line))
+        failed = scans or not used
+        failures += bool(failed)
+
+        print(f'{view:<15} {"FAIL" if failed else "ok":<5} '
+              f'uses: {", ".join(used) or "-"}'
+              f'{"  seq scans: " + ", ".join(scans) if scans else ""}')
+
+    return failures
+
+class ExplainCommand(Command):
+
+    'EXPLAIN the statements of every listing, detail and search view and check their indexes'
+
+    def run(self):
+        if db.engine.dialect.name != 'postgresql':
+            print('The index check needs PostgreSQL.')
+            return 1
+
+        return 1 if check_index_usage() else 0
@@ -0,0 +1,35 @@
+from datetime import datetime
+from functools import lru_cache
+import dateutil.parser
+from babel import Locale
+from babel.dates import parse_pattern
+
+#----------------------------------------------------------------------------#
+# Datetime filter.
+#----------------------------------------------------------------------------#
+
+DATETIME_FORMATS = {'full': "EEEE MMMM, d, y 'at' h:mma",
+                    'medium': "EE MM, dd, y h:mma"}
+
+@lru_cache(maxsize=None)
+def _compiled_pattern(format, locale):
+
+    # babel re-parses the pattern string and re-resolves the locale on every
+    # format_datetime() call; both only depend on the format/locale pair
+    return parse_pattern(DATETIME_FORMATS.get(format, format)), Locale.parse(locale)
+
+@lru_cache(maxsize=4096)
+def _format_datetime(value, format, locale):
+
+    pattern, locale = _compiled_pattern(format, locale)
+
+    return pattern.apply(value, locale)
+
+def format_datetime(value, format='medium', locale='en'):
+
+    # datetimes are formatted as they are; strings are still accepted for
+    # templates that are handed pre-rendered values
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(value)
+
+    return _format_datetime(value, format, locale)
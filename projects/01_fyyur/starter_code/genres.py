@@ -0,0 +1,102 @@
+import threading
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+from models import (db,
+                    Genre)
+
+#----------------------------------------------------------------------------#
+# Genre name -> id cache.
+#----------------------------------------------------------------------------#
+
+_genre_ids = {}
+_genre_ids_lock = threading.Lock()
+
+def invalidate_genre_cache(*args):
+
+    with _genre_ids_lock:
+        _genre_ids.clear()
+
+def _remember(genres):
+
+    with _genre_ids_lock:
+        _genre_ids.update({genre.name: genre.id for genre in genres})
+
+# a rolled back transaction may take freshly inserted genres with it,
+# and renamed or deleted genres must not be served from the cache
+event.listen(db.session, 'after_rollback', invalidate_genre_cache)
+event.listen(Genre, 'after_update', invalidate_genre_cache)
+event.listen(Genre, 'after_delete', invalidate_genre_cache)
+
+#----------------------------------------------------------------------------#
+# Resolver.
+#----------------------------------------------------------------------------#
+
+def _insert_missing(names):
+
+    rows = [{'name': name} for name in names]
+
+    # relies on the unique index on Genre.name: rows inserted concurrently by
+    # another submission are skipped instead of duplicated
+    if db.session.get_bind().dialect.name == 'postgresql':
+        statement = postgresql.insert(Genre.__table__).values(rows).on_conflict_do_nothing(
+            index_elements=['name'])
+    else:
+        statement = Genre.__table__.insert().prefix_with('OR IGNORE').values(rows)
+
+    db.session.execute(statement)
+
+def resolve_genres(names):
+
+    names = list(dict.fromkeys(name for name in names if name))
+
+    if not names:
+        return []
+
+    with _genre_ids_lock:
+        cached_ids = [_genre_ids[name] for name in names if name in _genre_ids]
+
+    if len(cached_ids) == len(names):
+        genres = Genre.query.filter(Genre.id.in_(cached_ids)).all()
+
+        if len(genres) == len(names):
+            return genres
+
+        invalidate_genre_cache()
+
+    genres = Genre.query.filter(Genre.name.in_(names)).all()
+
+    # only rows that were already there are cached; genres inserted below
+    # are not visible to other sessions until the caller commits
+    _remember(genres)
+
+    missing = set(names) - {genre.name for genre in genres}
+
+    if missing:
+        _insert_missing(sorted(missing))
+        genres += Genre.query.filter(Genre.name.in_(missing)).all()
+
+    return genres
+
+def genre_ids(names):
+
+    # name -> id for bulk loaders that write the association tables directly
+    names = set(name for name in names if name)
+
+    with _genre_ids_lock:
+        ids = {name: _genre_ids[name] for name in names if name in _genre_ids}
+
+    missing = names - set(ids)
+
+    if missing:
+        rows = db.session.query(Genre.id, Genre.name).filter(Genre.name.in_(missing)).all()
+        _remember(rows)
+        ids.update({row.name: row.id for row in rows})
+
+        missing -= set(ids)
+
+        if missing:
+            _insert_missing(sorted(missing))
+            ids.update({row.name: row.id for row in
+                        db.session.query(Genre.id, Genre.name).filter(Genre.name.in_(missing))})
+
+    return ids
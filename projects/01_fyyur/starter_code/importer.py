@@ -0,0 +1,247 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from itertools import islice
+import regex as re
+import dateutil.parser
+from flask_script import (Command,
+                          Option)
+from models import (db,
+                    Venue,
+                    Artist,
+                    Show,
+                    venue_genre_table,
+                    artist_genre_table)
+from genres import genre_ids
+from stats import (OWNERS,
+                   refresh_show_stats)
+
+#----------------------------------------------------------------------------#
+# Readers.
+#----------------------------------------------------------------------------#
+
+def read_records(path):
+
+    # streams one dict per line/row so memory does not grow with the file
+    with open(path, newline='', encoding='utf-8') as source:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(source)
+
+def batched(records, size):
+
+    records = iter(records)
+    batch = list(islice(records, size))
+
+    while batch:
+        yield batch
+        batch = list(islice(records, size))
+
+def _flag(value):
+
+    if isinstance(value, bool):
+        return value
+
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'y')
+
+def _genres(value):
+
+    if isinstance(value, list):
+        return [genre.strip() for genre in value if genre.strip()]
+
+    return [genre.strip() for genre in (value or '').split(',') if genre.strip()]
+
+def _timestamp(value):
+
+    # dateutil is two orders of magnitude slower than fromisoformat, so it
+    # is only used for values that are not ISO 8601
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.parse(value)
+
+def _text(record, column):
+
+    value = record.get(column)
+
+    return value.strip() if isinstance(value, str) else value
+
+#----------------------------------------------------------------------------#
+# Writers.
+#----------------------------------------------------------------------------#
+
+def _is_postgresql():
+
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+def _allocate_ids(table, count):
+
+    if _is_postgresql():
+        return [row[0] for row in db.session.execute(
+            'SELECT nextval(pg_get_serial_sequence(:table, \'id\')) FROM generate_series(1, :count)',
+            {'table': f'"{table.name}"', 'count': count})]
+
+    first = (db.session.execute(f'SELECT MAX(id) FROM "{table.name}"').scalar() or 0) + 1
+
+    return list(range(first, first + count))
+
+def _bump_sequence(table):
+
+    if _is_postgresql():
+        db.session.execute(f'SELECT setval(pg_get_serial_sequence(\'"{table.name}"\', \'id\'), '
+                           f'(SELECT COALESCE(MAX(id), 1) FROM "{table.name}"))')
+
+def _copy_field(value):
+
+    # every value is quoted, so empty strings stay empty strings and
+    # only the unquoted \N marker is read as NULL
+    if value is None:
+        return '\\N'
+
+    return '"{}"'.format(str(value).replace('"', '""'))
+
+def write_rows(table, columns, rows):
+
+    if not rows:
+        return
+
+    if _is_postgresql():
+        # COPY skips per-row statement overhead entirely
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(','.join(_copy_field(row[column]) for column in columns) + '\n')
+        buffer.seek(0)
+
+        cursor = db.session.connection().connection.cursor()
+        cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH CSV NULL \'\\N\''.format(
+            table.name, ', '.join(f'"{column}"' for column in columns)), buffer)
+    else:
+        db.session.execute(table.insert(), rows)
+
+#----------------------------------------------------------------------------#
+# Import.
+#----------------------------------------------------------------------------#
+
+VENUE_COLUMNS = ('id', 'name', 'city', 'state', 'address', 'phone', 'image_link',
+                 'facebook_link', 'website', 'seeking_talent', 'seeking_description')
+
+ARTIST_COLUMNS = ('id', 'name', 'city', 'state', 'phone', 'image_link',
+                  'facebook_link', 'website', 'seeking_venue', 'seeking_description')
+
+SHOW_COLUMNS = ('id', 'start_time', 'artist_id', 'venue_id')
+
+class Progress:
+
+    def __init__(self, label):
+        self.label = label
+        self.rows = 0
+        self.started = time.monotonic()
+
+    def add(self, rows):
+        self.rows += rows
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        print(f'{self.label}: {self.rows} rows, {self.rows / elapsed:.0f} rows/sec')
+
+def import_entities(path, model, columns, genre_table, owner_column, batch_size=10000):
+
+    table = model.__table__
+    flags = [column for column in columns if column.startswith('seeking_') and column != 'seeking_description']
+    progress = Progress(table.name)
+    explicit_ids = False
+
+    for batch in batched(read_records(path), batch_size):
+        rows = []
+
+        for record in batch:
+            row = {column: _text(record, column) for column in columns}
+            row['id'] = int(row['id']) if row['id'] else None
+            row['phone'] = re.sub(r'\D', '', row['phone'] or '')
+            row.update({flag: _flag(row[flag]) for flag in flags})
+            rows.append(row)
+
+        # keep ids given in the file so shows can refer to them
+        fresh = [row for row in rows if not row['id']]
+        explicit_ids = explicit_ids or len(fresh) < len(rows)
+
+        for row, new_id in zip(fresh, _allocate_ids(table, len(fresh)) if fresh else []):
+            row['id'] = new_id
+
+        genres = [_genres(record.get('genres')) for record in batch]
+        ids = genre_ids(name for names in genres for name in names)
+
+        write_rows(table, columns, rows)
+        write_rows(genre_table, ('genre_id', owner_column),
+                   [{'genre_id': genre_id, owner_column: row['id']}
+                    for row, names in zip(rows, genres)
+                    for genre_id in {ids[name] for name in names}])
+
+        db.session.commit()
+        progress.add(len(rows))
+
+    if explicit_ids:
+        _bump_sequence(table)
+        db.session.commit()
+
+    return progress.rows
+
+def import_shows(path, batch_size=10000):
+
+    table = Show.__table__
+    progress = Progress(table.name)
+    explicit_ids = False
+
+    for batch in batched(read_records(path), batch_size):
+        rows = [{'id': int(record['id']) if record.get('id') else None,
+                 'start_time': _timestamp(record['start_time']),
+                 'artist_id': int(record['artist_id']),
+                 'venue_id': int(record['venue_id'])} for record in batch]
+
+        fresh = [row for row in rows if not row['id']]
+        explicit_ids = explicit_ids or len(fresh) < len(rows)
+
+        for row, new_id in zip(fresh, _allocate_ids(table, len(fresh)) if fresh else []):
+            row['id'] = new_id
+
+        write_rows(table, SHOW_COLUMNS, rows)
+
+        db.session.commit()
+        progress.add(len(rows))
+
+    if explicit_ids:
+        _bump_sequence(table)
+        db.session.commit()
+
+    return progress.rows
+
+class ImportCommand(Command):
+
+    'Bulk-load venues, artists and shows from CSV or JSONL files'
+
+    option_list = (Option('--venues', dest='venues'),
+                   Option('--artists', dest='artists'),
+                   Option('--shows', dest='shows'),
+                   Option('--batch-size', dest='batch_size', type=int, default=10000))
+
+    def run(self, venues, artists, shows, batch_size):
+        if venues:
+            import_entities(venues, Venue, VENUE_COLUMNS, venue_genre_table, 'venue_id', batch_size)
+        if artists:
+            import_entities(artists, Artist, ARTIST_COLUMNS, artist_genre_table, 'artist_id', batch_size)
+        if shows:
+            import_shows(shows, batch_size)
+
+        # rows written with COPY bypass the incremental show statistics
+        if venues or artists or shows:
+            for model, show_column in OWNERS:
+                refresh_show_stats(model, show_column)
+            db.session.commit()
+
+        # planner statistics are stale after a bulk load
+        if _is_postgresql():
+            db.session.execute('ANALYZE')
+            db.session.commit()
@@ -0,0 +1,161 @@
+import threading
+import time
+from flask import (g,
+                   has_request_context,
+                   request,
+                   request_started,
+                   request_finished,
+                   before_render_template,
+                   template_rendered)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Histograms.
+#----------------------------------------------------------------------------#
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500)
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+#----------------------------------------------------------------------------#
+# Request metrics.
+#----------------------------------------------------------------------------#
+
+METRICS = (('fyyur_request_duration_seconds', 'Wall time per request', 'wall', SECONDS_BUCKETS),
+           ('fyyur_request_sql_duration_seconds', 'Time spent in SQL per request', 'sql_time', SECONDS_BUCKETS),
+           ('fyyur_request_render_duration_seconds', 'Time spent rendering templates per request', 'render_time', SECONDS_BUCKETS),
+           ('fyyur_request_queries', 'SQL statements per request', 'queries', QUERY_BUCKETS))
+
+class RequestMetrics:
+
+    def __init__(self, app=None, slow_request_threshold=None, logged_statements=50):
+        self.slow_request_threshold = slow_request_threshold
+        self.logged_statements = logged_statements
+        self._histograms = {}
+        self._responses = {}
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+        # listening on the Engine class covers every engine the app creates
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+        request_started.connect(self._request_started, app)
+        before_render_template.connect(self._before_render_template, app)
+        template_rendered.connect(self._template_rendered, app)
+        request_finished.connect(self._request_finished, app)
+
+    # per-request accounting lives on flask.g
+
+    def _current(self):
+        if has_request_context():
+            return g.get('_request_metrics')
+
+    def _request_started(self, sender, **extra):
+        g._request_metrics = {'started': time.perf_counter(),
+                              'queries': 0,
+                              'sql_time': 0.0,
+                              'render_time': 0.0,
+                              'render_started': None,
+                              'statements': []}
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        current = self._current()
+        if current is not None:
+            current['query_started'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        current = self._current()
+        if current is None or 'query_started' not in current:
+            return
+
+        elapsed = time.perf_counter() - current.pop('query_started')
+        current['queries'] += 1
+        current['sql_time'] += elapsed
+
+        if self.slow_request_threshold and len(current['statements']) < self.logged_statements:
+            current['statements'].append((elapsed, statement))
+
+    def _before_render_template(self, sender, template, context, **extra):
+        current = self._current()
+        if current is not None:
+            current['render_started'] = time.perf_counter()
+
+    def _template_rendered(self, sender, template, context, **extra):
+        current = self._current()
+        if current is not None and current['render_started'] is not None:
+            current['render_time'] += time.perf_counter() - current['render_started']
+            current['render_started'] = None
+
+    def _request_finished(self, sender, response, **extra):
+        current = self._current()
+        if current is None:
+            return
+
+        current['wall'] = time.perf_counter() - current['started']
+        endpoint = request.endpoint or 'unmatched'
+
+        with self._lock:
+            if endpoint not in self._histograms:
+                self._histograms[endpoint] = {key: Histogram(buckets) for _, _, key, buckets in METRICS}
+            for key, histogram in self._histograms[endpoint].items():
+                histogram.observe(current[key])
+
+            status = (endpoint, response.status_code)
+            self._responses[status] = self._responses.get(status, 0) + 1
+
+        if self.slow_request_threshold and current['wall'] >= self.slow_request_threshold:
+            self._log_slow_request(endpoint, current)
+
+    def _log_slow_request(self, endpoint, current):
+        statements = '\n'.join(f'  {elapsed * 1000:8.2f}ms  {" ".join(statement.split())}'
+                               for elapsed, statement in current['statements'])
+
+        self.app.logger.warning(f'Slow request {request.method} {request.path} ({endpoint}): '
+                                f'{current["wall"] * 1000:.1f}ms wall, '
+                                f'{current["queries"]} queries in {current["sql_time"] * 1000:.1f}ms, '
+                                f'render {current["render_time"] * 1000:.1f}ms\n{statements}')
+
+    # Prometheus text exposition format
+
+    def render(self):
+        lines = []
+
+        with self._lock:
+            for name, help, key, buckets in METRICS:
+                lines += [f'# HELP {name} {help}', f'# TYPE {name} histogram']
+
+                for endpoint, histograms in sorted(self._histograms.items()):
+                    histogram = histograms[key]
+                    for bound, count in zip(buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{endpoint="{endpoint}"}} {histogram.count}')
+
+            lines += ['# HELP fyyur_responses_total Responses by endpoint and status code',
+                      '# TYPE fyyur_responses_total counter']
+            for (endpoint, status), count in sorted(self._responses.items()):
+                lines.append(f'fyyur_responses_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+        return '\n'.join(lines) + '\n'
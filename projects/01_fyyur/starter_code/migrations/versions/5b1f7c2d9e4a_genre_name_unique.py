@@ -0,0 +1,52 @@
+"""unique index on Genre.name
+
+Revision ID: 5b1f7c2d9e4a
+Revises: cc494f541261
+Create Date: 2026-10-18 19:05:12.418233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1f7c2d9e4a'
+down_revision = 'cc494f541261'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # fold genres duplicated by concurrent submissions into the oldest row
+    # before the unique index is built
+    for table, column in (('artist_genre_table', 'artist_id'),
+                          ('venue_genre_table', 'venue_id')):
+        op.execute(f'''
+            INSERT INTO {table} (genre_id, {column})
+            SELECT DISTINCT keep.id, link.{column}
+            FROM {table} link
+            JOIN "Genre" genre ON genre.id = link.genre_id
+            JOIN (SELECT name, MIN(id) AS id FROM "Genre" GROUP BY name) keep ON keep.name = genre.name
+            WHERE keep.id <> genre.id
+              AND NOT EXISTS (SELECT 1 FROM {table} existing
+                              WHERE existing.genre_id = keep.id
+                                AND existing.{column} = link.{column})
+        ''')
+        op.execute(f'''
+            DELETE FROM {table}
+            WHERE genre_id IN (SELECT id FROM "Genre"
+                               WHERE name IS NOT NULL
+                                 AND id NOT IN (SELECT MIN(id) FROM "Genre" GROUP BY name))
+        ''')
+
+    op.execute('''
+        DELETE FROM "Genre"
+        WHERE name IS NOT NULL
+          AND id NOT IN (SELECT MIN(id) FROM "Genre" GROUP BY name)
+    ''')
+
+    op.create_index(op.f('ix_Genre_name'), 'Genre', ['name'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Genre_name'), table_name='Genre')
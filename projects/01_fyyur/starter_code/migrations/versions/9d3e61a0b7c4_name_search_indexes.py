@@ -0,0 +1,29 @@
+"""full-text search indexes on Venue.name and Artist.name
+
+Revision ID: 9d3e61a0b7c4
+Revises: 5b1f7c2d9e4a
+Create Date: 2026-10-18 19:41:37.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3e61a0b7c4'
+down_revision = '5b1f7c2d9e4a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the indexed expression must stay identical to search.name_document()
+    op.execute('''CREATE INDEX "ix_Venue_name_tsv" ON "Venue"
+                  USING gin (to_tsvector('simple', coalesce(name, '')))''')
+    op.execute('''CREATE INDEX "ix_Artist_name_tsv" ON "Artist"
+                  USING gin (to_tsvector('simple', coalesce(name, '')))''')
+
+
+def downgrade():
+    op.drop_index('ix_Artist_name_tsv', table_name='Artist')
+    op.drop_index('ix_Venue_name_tsv', table_name='Venue')
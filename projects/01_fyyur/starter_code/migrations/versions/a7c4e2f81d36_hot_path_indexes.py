@@ -0,0 +1,38 @@
+"""composite indexes for listing, detail and search views
+
+Revision ID: a7c4e2f81d36
+Revises: 9d3e61a0b7c4
+Create Date: 2026-10-18 20:27:51.116804
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e2f81d36'
+down_revision = '9d3e61a0b7c4'
+branch_labels = None
+depends_on = None
+
+INDEXES = (('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time']),
+           ('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time']),
+           ('ix_Show_start_time_id', 'Show', ['start_time', 'id']),
+           ('ix_Venue_state_city_name', 'Venue', ['state', 'city', 'name']),
+           ('ix_Artist_name_id', 'Artist', ['name', 'id']))
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY does not lock out writes on PostgreSQL but
+    # cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(op.f(name), table, columns,
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(op.f(name), table_name=table,
+                          postgresql_concurrently=True)
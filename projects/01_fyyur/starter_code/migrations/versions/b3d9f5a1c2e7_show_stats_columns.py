@@ -0,0 +1,44 @@
+"""denormalized show statistics on Venue and Artist
+
+Revision ID: b3d9f5a1c2e7
+Revises: a7c4e2f81d36
+Create Date: 2026-10-18 21:03:26.540187
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d9f5a1c2e7'
+down_revision = 'a7c4e2f81d36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, column in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_time', sa.DateTime(), nullable=True))
+
+        # same computation as stats.refresh_show_stats()
+        op.execute(f'''
+            UPDATE "{table}" SET
+                upcoming_shows_count = (SELECT COUNT(*) FROM "Show"
+                                        WHERE "Show".{column} = "{table}".id
+                                          AND "Show".start_time > CURRENT_TIMESTAMP),
+                past_shows_count = (SELECT COUNT(*) FROM "Show"
+                                    WHERE "Show".{column} = "{table}".id
+                                      AND "Show".start_time <= CURRENT_TIMESTAMP),
+                next_show_time = (SELECT MIN(start_time) FROM "Show"
+                                  WHERE "Show".{column} = "{table}".id
+                                    AND "Show".start_time > CURRENT_TIMESTAMP)
+        ''')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'next_show_time')
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
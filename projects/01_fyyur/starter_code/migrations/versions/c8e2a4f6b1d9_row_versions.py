@@ -0,0 +1,26 @@
+"""row version counters on Venue and Artist
+
+Revision ID: c8e2a4f6b1d9
+Revises: b3d9f5a1c2e7
+Create Date: 2026-10-18 23:12:08.402913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e2a4f6b1d9'
+down_revision = 'b3d9f5a1c2e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'version')
@@ -1,8 +1,8 @@
 from __main__ import app
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from routing import RoutingSQLAlchemy
 
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -14,7 +14,9 @@ class Genre(db.Model):
 
     id = db.Column(db.Integer,
                    primary_key=True)
-    name = db.Column(db.String)
+    name = db.Column(db.String,
+                     unique=True,
+                     index=True)
 
     def __repr__(self):
         return f'<Genre {self.id} {self.name}>'
@@ -43,6 +45,10 @@ venue_genre_table = db.Table('venue_genre_table',
 class Venue(db.Model):
 
     __tablename__ = 'Venue'
+    __table_args__ = (db.Index('ix_Venue_state_city_name',
+                               'state',
+                               'city',
+                               'name'),)
 
     id = db.Column(db.Integer,
                    primary_key=True)
@@ -66,12 +72,33 @@ class Venue(db.Model):
     shows = db.relationship("Show",
                             backref=db.backref('venues'))
 
+    # maintained by stats.py
+    upcoming_shows_count = db.Column(db.Integer,
+                                     nullable=False,
+                                     default=0,
+                                     server_default='0')
+    past_shows_count = db.Column(db.Integer,
+                                 nullable=False,
+                                 default=0,
+                                 server_default='0')
+    next_show_time = db.Column(db.DateTime)
+
+    # bumped by every UPDATE of the row, see etags.py
+    version = db.Column(db.Integer,
+                        nullable=False,
+                        default=1,
+                        server_default='1',
+                        onupdate=db.text('version + 1'))
+
     def __repr__(self):
         return f'<Venue {self.id} {self.name}>'
 
 class Artist(db.Model):
 
     __tablename__ = 'Artist'
+    __table_args__ = (db.Index('ix_Artist_name_id',
+                               'name',
+                               'id'),)
 
     id = db.Column(db.Integer,
                    primary_key=True)
@@ -94,12 +121,39 @@ class Artist(db.Model):
     shows = db.relationship("Show",
                             backref=db.backref('artists'))
 
+    # maintained by stats.py
+    upcoming_shows_count = db.Column(db.Integer,
+                                     nullable=False,
+                                     default=0,
+                                     server_default='0')
+    past_shows_count = db.Column(db.Integer,
+                                 nullable=False,
+                                 default=0,
+                                 server_default='0')
+    next_show_time = db.Column(db.DateTime)
+
+    # bumped by every UPDATE of the row, see etags.py
+    version = db.Column(db.Integer,
+                        nullable=False,
+                        default=1,
+                        server_default='1',
+                        onupdate=db.text('version + 1'))
+
     def __repr__(self):
         return f'<Artist {self.id} {self.name}>'
 
 class Show(db.Model):
 
     __tablename__ = 'Show'
+    __table_args__ = (db.Index('ix_Show_venue_id_start_time',
+                               'venue_id',
+                               'start_time'),
+                      db.Index('ix_Show_artist_id_start_time',
+                               'artist_id',
+                               'start_time'),
+                      db.Index('ix_Show_start_time_id',
+                               'start_time',
+                               'id'))
 
     id = db.Column(db.Integer,
                    primary_key=True)
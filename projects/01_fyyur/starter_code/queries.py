@@ -0,0 +1,148 @@
+import base64
+import json
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import (case,
+                        func,
+                        tuple_)
+from sqlalchemy.orm import joinedload
+from models import (db,
+                    Venue,
+                    Artist,
+                    Show)
+
+#----------------------------------------------------------------------------#
+# Venue directory.
+#----------------------------------------------------------------------------#
+
+def venue_directory():
+
+    # every venue with its upcoming-show count in a single statement; the
+    # counts are the denormalized ones kept up to date by stats.py
+    rows = db.session.query(Venue.state,
+                            Venue.city,
+                            Venue.id,
+                            Venue.name,
+                            Venue.upcoming_shows_count.label('num_upcoming_shows')).order_by(Venue.state,
+                                                                                            Venue.city,
+                                                                                            Venue.name,
+                                                                                            Venue.id).all()
+
+    areas = []
+
+    for (state, city), venues in groupby(rows, key=lambda row: (row.state, row.city)):
+        areas.append({'city': city,
+                      'state': state,
+                      'venues': [{'id': venue.id,
+                                  'name': venue.name,
+                                  'num_upcoming_shows': venue.num_upcoming_shows} for venue in venues]})
+
+    return areas
+
+#----------------------------------------------------------------------------#
+# Show timelines.
+#----------------------------------------------------------------------------#
+
+def _show_timeline(owner_column, owner_id, counterpart, counterpart_column, prefix, limit=None, now=None):
+
+    # one statement for both halves of the timeline: window functions split
+    # the shows into past/upcoming, rank them (soonest upcoming first, latest
+    # past first) and count each half before the limit is applied
+    now = now or datetime.now()
+    upcoming = Show.start_time > now
+
+    timeline = db.session.query(Show.start_time,
+                                counterpart.id.label('counterpart_id'),
+                                counterpart.name.label('counterpart_name'),
+                                counterpart.image_link.label('counterpart_image_link'),
+                                upcoming.label('upcoming'),
+                                func.row_number().over(partition_by=upcoming,
+                                                       order_by=(case([(upcoming, Show.start_time)]).asc(),
+                                                                 Show.start_time.desc())).label('position'),
+                                func.count(Show.id).over(partition_by=upcoming).label('total')).join(
+        counterpart, counterpart_column == counterpart.id).filter(
+        owner_column == owner_id).subquery()
+
+    query = db.session.query(timeline)
+
+    if limit:
+        query = query.filter(timeline.c.position <= limit)
+
+    rows = query.order_by(timeline.c.upcoming.desc(),
+                          timeline.c.position).all()
+
+    result = {'past_shows': [],
+              'upcoming_shows': [],
+              'past_shows_count': 0,
+              'upcoming_shows_count': 0}
+
+    for row in rows:
+        half = 'upcoming' if row.upcoming else 'past'
+        result[half + '_shows'].append({prefix + '_id': row.counterpart_id,
+                                        prefix + '_name': row.counterpart_name,
+                                        prefix + '_image_link': row.counterpart_image_link,
+                                        'start_time': row.start_time})
+        result[half + '_shows_count'] = row.total
+
+    return result
+
+def venue_timeline(venue_id, limit=None, now=None):
+
+    return _show_timeline(Show.venue_id, venue_id, Artist, Show.artist_id, 'artist', limit=limit, now=now)
+
+def artist_timeline(artist_id, limit=None, now=None):
+
+    return _show_timeline(Show.artist_id, artist_id, Venue, Show.venue_id, 'venue', limit=limit, now=now)
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+def encode_cursor(values):
+
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+def decode_cursor(cursor, *types):
+
+    # a cursor that does not decode to the expected key is treated as absent
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(types):
+            return None
+        return tuple(kind(value) for kind, value in zip(types, values))
+    except (ValueError, TypeError):
+        return None
+
+def keyset_page(query, columns, key, after=None, per_page=50):
+
+    # seeks past the last key of the previous page instead of using OFFSET,
+    # so that page N costs the same as page 1
+    if after is not None:
+        query = query.filter(tuple_(*columns) > tuple_(*after))
+
+    rows = query.order_by(*columns).limit(per_page + 1).all()
+
+    next_cursor = encode_cursor(key(rows[per_page - 1])) if len(rows) > per_page else None
+
+    return rows[:per_page], next_cursor
+
+def artists_page(cursor=None, per_page=50):
+
+    after = decode_cursor(cursor, str, int) if cursor else None
+
+    return keyset_page(Artist.query,
+                       (Artist.name, Artist.id),
+                       key=lambda artist: (artist.name, artist.id),
+                       after=after,
+                       per_page=per_page)
+
+def shows_page(cursor=None, per_page=50):
+
+    after = decode_cursor(cursor, datetime.fromisoformat, int) if cursor else None
+
+    return keyset_page(Show.query.options(joinedload(Show.venue),
+                                          joinedload(Show.artist)),
+                       (Show.start_time, Show.id),
+                       key=lambda show: (show.start_time, show.id),
+                       after=after,
+                       per_page=per_page)
@@ -0,0 +1,78 @@
+import random
+import time
+from functools import wraps
+from flask import (current_app,
+                   g,
+                   has_request_context,
+                   session)
+from flask_sqlalchemy import (SQLAlchemy,
+                              SignallingSession,
+                              get_state)
+from sqlalchemy import (event,
+                        orm)
+from sqlalchemy.sql.expression import (Select,
+                                       UpdateBase)
+
+#----------------------------------------------------------------------------#
+# Read-replica routing.
+#
+# Views marked with @read_only send their SELECTs to one of the
+# SQLALCHEMY_BINDS named replica_*. Everything else, every statement
+# after the first write in a transaction, and every request within
+# REPLICA_PIN_SECONDS of a write by the same client use the primary.
+#----------------------------------------------------------------------------#
+
+PIN_KEY = '_primary_until'
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('replica') if has_request_context() else None
+
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info['wrote'] = True
+        elif replica and not self.info.get('wrote') and isinstance(clause, Select):
+            return get_state(self.app).db.get_engine(self.app, bind=replica)
+
+        return super().get_bind(mapper, clause)
+
+def _pin_to_primary(db_session):
+
+    # the client reads its own writes until the replicas have caught up
+    if db_session.info.pop('wrote', False) and has_request_context():
+        pin = current_app.config.get('REPLICA_PIN_SECONDS')
+        if pin:
+            session[PIN_KEY] = time.time() + pin
+
+def _forget_writes(db_session):
+
+    db_session.info.pop('wrote', None)
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        factory = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+        event.listen(factory, 'after_commit', _pin_to_primary)
+        event.listen(factory, 'after_rollback', _forget_writes)
+
+        return factory
+
+    def replicas(self, app=None):
+        app = self.get_app(app)
+
+        return sorted(bind for bind in app.config.get('SQLALCHEMY_BINDS') or {}
+                      if bind.startswith('replica'))
+
+def read_only(view):
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        replicas = current_app.extensions['sqlalchemy'].db.replicas()
+
+        if replicas and session.get(PIN_KEY, 0) < time.time():
+            g.replica = random.choice(replicas)
+
+        return view(*args, **kwargs)
+
+    return wrapper
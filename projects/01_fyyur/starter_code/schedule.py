@@ -0,0 +1,62 @@
+from sqlalchemy import (and_,
+                        or_)
+from models import (db,
+                    Venue,
+                    Artist,
+                    Show)
+
+#----------------------------------------------------------------------------#
+# Calendar.
+#----------------------------------------------------------------------------#
+
+def calendar(start, end, venue_id=None, artist_id=None, city=None, state=None, limit=1000):
+
+    # every filter combination is a range scan on one of the
+    # (owner_id, start_time) indexes, or on (start_time, id) without an owner
+    query = db.session.query(Show.id,
+                             Show.start_time,
+                             Show.venue_id,
+                             Venue.name.label('venue_name'),
+                             Show.artist_id,
+                             Artist.name.label('artist_name')).join(
+                                 Venue, Show.venue_id == Venue.id).join(
+                                 Artist, Show.artist_id == Artist.id).filter(
+                                 Show.start_time >= start,
+                                 Show.start_time < end)
+
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    if state:
+        query = query.filter(Venue.state == state)
+    if city:
+        query = query.filter(Venue.city == city)
+
+    rows = query.order_by(Show.start_time, Show.id).limit(limit + 1).all()
+
+    return [{'id': row.id,
+             'start_time': row.start_time.isoformat(),
+             'venue_id': row.venue_id,
+             'venue_name': row.venue_name,
+             'artist_id': row.artist_id,
+             'artist_name': row.artist_name} for row in rows[:limit]], len(rows) > limit
+
+#----------------------------------------------------------------------------#
+# Double-booking check.
+#----------------------------------------------------------------------------#
+
+def find_conflict(venue_id, artist_id, start_time, slot):
+
+    # shows have no end time, so two shows conflict when they start less
+    # than one slot apart; each side is a bounded probe on its index
+    window = and_(Show.start_time > start_time - slot,
+                  Show.start_time < start_time + slot)
+
+    return db.session.query(Show.id,
+                            Show.venue_id,
+                            Show.artist_id,
+                            Show.start_time).filter(
+                                window,
+                                or_(Show.venue_id == venue_id,
+                                    Show.artist_id == artist_id)).order_by(Show.start_time).first()
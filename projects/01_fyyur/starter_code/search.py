@@ -0,0 +1,63 @@
+import regex as re
+from sqlalchemy import func
+from models import (db,
+                    Venue,
+                    Artist)
+
+#----------------------------------------------------------------------------#
+# Full-text search.
+#----------------------------------------------------------------------------#
+
+SEARCH_CONFIG = 'simple'
+
+def name_document(model):
+
+    # must match the expression indexed in migrations/versions/9d3e61a0b7c4
+    return func.to_tsvector(SEARCH_CONFIG, func.coalesce(model.name, ''))
+
+def _prefix_query(search_term):
+
+    # every word of the term has to prefix-match a word of the name,
+    # e.g. "mus ho" finds "The Musical Hop"
+    words = re.findall(r'\w+', search_term.lower())
+
+    return ' & '.join(word + ':*' for word in words)
+
+def _search(model, search_term, page=1, per_page=20):
+
+    page = max(page, 1)
+    terms = _prefix_query(search_term)
+
+    filters, ranking = [], []
+
+    if terms and db.session.get_bind().dialect.name == 'postgresql':
+        query = func.to_tsquery(SEARCH_CONFIG, terms)
+        filters.append(name_document(model).op('@@')(query))
+        ranking.append(func.ts_rank(name_document(model), query).desc())
+    elif terms:
+        filters.append(model.name.ilike(f'%{search_term}%'))
+
+    count = db.session.query(func.count(model.id)).filter(*filters).scalar()
+
+    rows = db.session.query(model.id,
+                            model.name,
+                            model.upcoming_shows_count.label('num_upcoming_shows')).filter(
+        *filters).order_by(*ranking,
+                           model.name,
+                           model.id).limit(per_page).offset((page - 1) * per_page).all()
+
+    return {"count": count,
+            "page": page,
+            "per_page": per_page,
+            "has_next": page * per_page < count,
+            "data": [{"id": row.id,
+                      "name": row.name,
+                      "num_upcoming_shows": row.num_upcoming_shows} for row in rows]}
+
+def find_venues(search_term, page=1, per_page=20):
+
+    return _search(Venue, search_term, page=page, per_page=per_page)
+
+def find_artists(search_term, page=1, per_page=20):
+
+    return _search(Artist, search_term, page=page, per_page=per_page)
@@ -0,0 +1,142 @@
+from datetime import datetime
+from flask_script import (Manager,
+                          Command,
+                          Option)
+from sqlalchemy import (and_,
+                        case,
+                        func,
+                        or_,
+                        select)
+from models import (db,
+                    Venue,
+                    Artist,
+                    Show)
+
+#----------------------------------------------------------------------------#
+# Denormalized show statistics.
+#
+# Venue and Artist carry upcoming_shows_count, past_shows_count and
+# next_show_time. New shows bump them in place, deletes recompute the rows
+# they touch, and the rollover moves shows whose start time has passed
+# from upcoming to past.
+#----------------------------------------------------------------------------#
+
+OWNERS = ((Venue, Show.venue_id),
+          (Artist, Show.artist_id))
+
+def _computed(model, show_column, now):
+
+    # correlated subqueries answered from the (owner_id, start_time) indexes
+    owned = show_column == model.id
+
+    return {model.upcoming_shows_count: select([func.count(Show.id)]).where(
+                and_(owned, Show.start_time > now)).as_scalar(),
+            model.past_shows_count: select([func.count(Show.id)]).where(
+                and_(owned, Show.start_time <= now)).as_scalar(),
+            model.next_show_time: select([func.min(Show.start_time)]).where(
+                and_(owned, Show.start_time > now)).as_scalar()}
+
+def refresh_show_stats(model, show_column, ids=None, stale_only=False, now=None):
+
+    now = now or datetime.now()
+    query = model.query
+
+    if ids is not None:
+        query = query.filter(model.id.in_(ids))
+
+    if stale_only:
+        query = query.filter(model.next_show_time <= now)
+
+    return query.update(_computed(model, show_column, now),
+                        synchronize_session=False)
+
+def record_new_show(show, now=None):
+
+    now = now or datetime.now()
+
+    for model, show_column in OWNERS:
+        owner_id = getattr(show, show_column.key)
+
+        if show.start_time > now:
+            values = {model.upcoming_shows_count: model.upcoming_shows_count + 1,
+                      model.next_show_time: case([(or_(model.next_show_time.is_(None),
+                                                       model.next_show_time > show.start_time),
+                                                   show.start_time)],
+                                                 else_=model.next_show_time)}
+        else:
+            values = {model.past_shows_count: model.past_shows_count + 1}
+
+        model.query.filter(model.id == owner_id).update(values,
+                                                        synchronize_session=False)
+
+def discard_shows(*criteria):
+
+    # deletes the matching shows and recomputes only the venues and artists
+    # that had one of them
+    owners = {model: [row[0] for row in
+                      db.session.query(show_column).filter(*criteria).distinct()]
+              for model, show_column in OWNERS}
+
+    Show.query.filter(*criteria).delete(synchronize_session=False)
+
+    for model, show_column in OWNERS:
+        if owners[model]:
+            refresh_show_stats(model, show_column, ids=owners[model])
+
+    return owners
+
+def rollover_shows(now=None):
+
+    # only rows whose next show has started can have stale counts
+    now = now or datetime.now()
+
+    return {model.__tablename__: refresh_show_stats(model, show_column, stale_only=True, now=now)
+            for model, show_column in OWNERS}
+
+def drift(now=None):
+
+    now = now or datetime.now()
+    report = {}
+
+    for model, show_column in OWNERS:
+        computed = _computed(model, show_column, now)
+        report[model.__tablename__] = db.session.query(model.id).filter(
+            or_(*[column.is_distinct_from(value) for column, value in computed.items()])).count()
+
+    return report
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+class RolloverCommand(Command):
+
+    'Move shows that have started from upcoming to past'
+
+    def run(self):
+        moved = rollover_shows()
+        db.session.commit()
+        print(', '.join(f'{table}: {rows} rows refreshed' for table, rows in moved.items()))
+
+class VerifyCommand(Command):
+
+    'Recompute the statistics from scratch and report drift'
+
+    option_list = (Option('--repair', dest='repair', action='store_true', default=False),)
+
+    def run(self, repair):
+        now = datetime.now()
+        report = drift(now)
+        print(', '.join(f'{table}: {rows} rows drifted' for table, rows in report.items()))
+
+        if repair and any(report.values()):
+            for model, show_column in OWNERS:
+                refresh_show_stats(model, show_column, now=now)
+            db.session.commit()
+            print('repaired')
+
+        return 1 if any(report.values()) and not repair else 0
+
+StatsCommand = Manager(usage='Maintain the denormalized show statistics')
+StatsCommand.add_command('rollover', RolloverCommand())
+StatsCommand.add_command('verify', VerifyCommand())
@@ -0,0 +1,359 @@
+import argparse
+import json
+import logging
+import math
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from werkzeug.serving import make_server
+
+from flaskr import create_app, QUESTIONS_PER_PAGE
+from flaskr.ingest import ingest
+from flaskr.quiz import question_changed
+from flaskr.sessions import new_session_id
+from models import db, Question, Category
+
+'''
+seeds a benchmark database with synthetic questions and drives every
+endpoint through the Flask test client and a concurrent HTTP client;
+throughput and latency percentiles are written as JSON, so two runs can
+be diffed or compared:
+
+    createdb trivia_bench
+    psql trivia_bench < trivia.psql
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --baseline before.json
+
+the benchmark database is trimmed or topped up to each dataset size, so
+never point --database at data you want to keep
+'''
+
+DATASETS = (1000, 100000, 1000000)
+REQUESTS = 200
+CONCURRENCY = 8
+SEED_BATCH_SIZE = 5000
+BULK_SIZE = 100
+# p95 slowdown reported as a regression by --baseline
+TOLERANCE = 0.2
+
+CATEGORIES = ('Science', 'Art', 'Geography', 'History', 'Entertainment', 'Sports')
+WORDS = ('river', 'planet', 'painter', 'empire', 'novel', 'island', 'album',
+         'mountain', 'element', 'treaty', 'goalkeeper', 'symphony', 'desert',
+         'volcano', 'sculptor', 'dynasty', 'film', 'ocean', 'molecule',
+         'champion', 'capital', 'poet', 'galaxy', 'cathedral', 'harbor',
+         'orchestra', 'marathon', 'glacier', 'pharaoh', 'comet')
+
+'''
+synthetic data
+'''
+
+def synthetic_questions(count, categories, rng):
+    for number in range(count):
+        yield {'question': 'Which {} {} the {}? #{}'.format(*rng.sample(WORDS, 3), number),
+               'answer': ' '.join(rng.sample(WORDS, 2)),
+               'difficulty': rng.randint(1, 5),
+               'category': rng.choice(categories)}
+
+def seed(app, size, rng):
+    '''brings the questions table to exactly size rows'''
+    with app.app_context():
+        if Category.query.count() == 0:
+            db.session.add_all([Category(type) for type in CATEGORIES])
+            db.session.commit()
+
+        categories = sorted(app.extensions['category_registry'].categories())
+        existing = Question.query.count()
+
+        if existing > size:
+            Question.query.delete()
+            db.session.commit()
+            question_changed()
+            existing = 0
+
+        ingest(synthetic_questions(size - existing, categories, rng),
+               set(categories),
+               batch_size=SEED_BATCH_SIZE)
+
+def dataset_state(app):
+    with app.app_context():
+        categories = sorted(app.extensions['category_registry'].categories())
+        counts = app.extensions['question_counts']
+        ids = app.extensions['question_pool'].ids(0)
+
+        return {'categories': categories,
+                'ids': ids,
+                'max_id': ids[-1] if ids else 0,
+                'pages': max(1, math.ceil(len(ids) / QUESTIONS_PER_PAGE)),
+                'category_pages': {category: max(1, math.ceil(counts.total(category) / QUESTIONS_PER_PAGE))
+                                   for category in categories}}
+
+def clean_up(app, state):
+    '''removes the questions added by the write endpoints'''
+    with app.app_context():
+        db.session.query(Question).filter(Question.id > state['max_id']).delete(synchronize_session=False)
+        db.session.commit()
+        question_changed()
+
+'''
+scenarios: (name, prepare, request) per endpoint; prepare(app, state)
+runs once before the requests are built, request(rng, state) returns
+(method, path, json body)
+'''
+
+def start_quiz_session(app, state):
+    response = app.test_client().post('/quizzes/sessions',
+                                      json={'quiz_category': {'id': 0}})
+    state['session_id'] = response.get_json()['session_id']
+
+def start_quiz_sessions(app, state):
+    # one finished game per DELETE request
+    sessions = app.extensions['quiz_sessions']
+    state['sessions'] = [new_session_id() for _ in range(state['requests'])]
+    for session_id in state['sessions']:
+        sessions.create(session_id, [])
+
+def collect_created_questions(app, state):
+    # the questions added by the POST /questions scenario just before
+    with app.app_context():
+        state['created'] = [row.id for row in
+                            db.session.query(Question.id).filter(Question.id > state['max_id'])]
+
+def category_page(rng, state):
+    category = rng.choice(state['categories'])
+    page = rng.randint(1, state['category_pages'][category])
+    return 'GET', '/categories/{}/questions?page={}'.format(category, page), None
+
+SCENARIOS = (
+    ('GET /categories', None,
+     lambda rng, state: ('GET', '/categories', None)),
+    ('GET /questions', None,
+     lambda rng, state: ('GET', '/questions?page={}'.format(rng.randint(1, state['pages'])), None)),
+    ('GET /categories/<id>/questions', None,
+     category_page),
+    ('POST /questions/search', None,
+     lambda rng, state: ('POST', '/questions/search', {'searchTerm': rng.choice(WORDS)})),
+    ('POST /quizzes', None,
+     lambda rng, state: ('POST', '/quizzes',
+                         {'quiz_category': {'id': rng.choice((0,) + tuple(state['categories']))},
+                          'previous_questions': rng.sample(state['ids'], min(20, len(state['ids'])))})),
+    ('POST /quizzes/sessions', None,
+     lambda rng, state: ('POST', '/quizzes/sessions',
+                         {'quiz_category': {'id': rng.choice(state['categories'])}})),
+    ('POST /quizzes/sessions/<session_id>/next', start_quiz_session,
+     lambda rng, state: ('POST', '/quizzes/sessions/{}/next'.format(state['session_id']), None)),
+    ('DELETE /quizzes/sessions/<session_id>', start_quiz_sessions,
+     lambda rng, state: ('DELETE', '/quizzes/sessions/{}'.format(
+         state['sessions'].pop() if state['sessions'] else 'unknown'), None)),
+    ('GET /cache/stats', None,
+     lambda rng, state: ('GET', '/cache/stats', None)),
+    ('POST /questions', None,
+     lambda rng, state: ('POST', '/questions',
+                         next(synthetic_questions(1, state['categories'], rng)))),
+    ('DELETE /questions/<question_id>', collect_created_questions,
+     lambda rng, state: ('DELETE', '/questions/{}'.format(
+         state['created'].pop() if state['created'] else 0), None)),
+    ('POST /questions/bulk', None,
+     lambda rng, state: ('POST', '/questions/bulk',
+                         list(synthetic_questions(BULK_SIZE, state['categories'], rng)))),
+)
+
+'''
+clients: run(requests) returns (latencies in seconds, status codes,
+wall time)
+'''
+
+class TestClient:
+
+  name = 'test_client'
+
+  def __init__(self, app):
+    self.client = app.test_client()
+
+  def run(self, requests):
+    latencies, statuses = [], []
+    started = time.perf_counter()
+
+    for method, path, body in requests:
+      request_started = time.perf_counter()
+      response = self.client.open(path, method=method, json=body)
+      latencies.append(time.perf_counter() - request_started)
+      statuses.append(response.status_code)
+
+    return latencies, statuses, time.perf_counter() - started
+
+class HttpClient:
+
+  name = 'http'
+
+  '''concurrent requests against a threaded werkzeug server on a free port'''
+
+  def __init__(self, app, concurrency):
+    self.concurrency = concurrency
+    self.server = make_server('127.0.0.1', 0, app, threaded=True)
+    self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+    threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+  def send(self, method, path, body):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    request = Request(self.url + path, data=data, method=method,
+                      headers={'Content-Type': 'application/json'})
+    started = time.perf_counter()
+
+    try:
+      with urlopen(request) as response:
+        response.read()
+        status = response.status
+    except HTTPError as e:
+      status = e.code
+
+    return time.perf_counter() - started, status
+
+  def run(self, requests):
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(self.concurrency) as executor:
+      results = list(executor.map(lambda request: self.send(*request), requests))
+
+    return [latency for latency, _ in results], [status for _, status in results], time.perf_counter() - started
+
+  def close(self):
+    self.server.shutdown()
+
+'''
+report
+'''
+
+def percentile(ordered, fraction):
+    # nearest rank
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def summarize(latencies, statuses, elapsed):
+    ordered = sorted(latencies)
+    codes = {}
+    for status in statuses:
+        codes[str(status)] = codes.get(str(status), 0) + 1
+
+    return {'requests': len(latencies),
+            'errors': sum(1 for status in statuses if status >= 400),
+            'statuses': codes,
+            'throughput': round(len(latencies) / elapsed, 1),
+            'mean_ms': round(1000 * sum(ordered) / len(ordered), 3),
+            'p50_ms': round(1000 * percentile(ordered, 0.50), 3),
+            'p95_ms': round(1000 * percentile(ordered, 0.95), 3),
+            'p99_ms': round(1000 * percentile(ordered, 0.99), 3)}
+
+def environment(database):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {'commit': commit,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': database.split('://')[0]}
+
+def compare(report, baseline, tolerance):
+    '''prints the p95 change of every endpoint in both reports; returns the regressions'''
+    regressions = []
+
+    for size, clients in sorted(report['results'].items(), key=lambda item: int(item[0])):
+        for client, endpoints in sorted(clients.items()):
+            for endpoint, result in sorted(endpoints.items()):
+                before = baseline.get('results', {}).get(size, {}).get(client, {}).get(endpoint)
+                if not before or not before['p95_ms']:
+                    continue
+
+                change = result['p95_ms'] / before['p95_ms'] - 1
+                regressed = change > tolerance
+                print('{:>8} {:<12} {:<42} p95 {:>10.3f} -> {:>10.3f} ms {:+7.1%}{}'.format(
+                      size, client, endpoint, before['p95_ms'], result['p95_ms'], change,
+                      '  REGRESSION' if regressed else ''))
+
+                if regressed:
+                    regressions.append((size, client, endpoint))
+
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the trivia API.')
+    parser.add_argument('--database', default='postgresql://localhost:5432/trivia_bench',
+                        help='benchmark database; its questions are replaced')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DATASETS),
+                        help='comma separated dataset sizes')
+    parser.add_argument('--requests', type=int, default=REQUESTS,
+                        help='requests per endpoint and client')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='-', help='JSON report, - for stdout')
+    parser.add_argument('--baseline', help='earlier report to compare against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    app = create_app({'DATABASE_PATH': args.database})
+
+    rng = random.Random(args.seed)
+    results = {}
+
+    for size in [int(size) for size in args.sizes.split(',')]:
+        started = time.monotonic()
+        seed(app, size, rng)
+        print('{} questions seeded in {:.1f}s'.format(size, time.monotonic() - started),
+              file=sys.stderr)
+
+        http = HttpClient(app, args.concurrency)
+
+        try:
+            for client in (TestClient(app), http):
+                state = dataset_state(app)
+                state['requests'] = args.requests
+
+                for name, prepare, build in SCENARIOS:
+                    if prepare:
+                        prepare(app, state)
+                    requests = [build(rng, state) for _ in range(args.requests)]
+
+                    result = summarize(*client.run(requests))
+                    results.setdefault(str(size), {}).setdefault(client.name, {})[name] = result
+
+                    print('{:>8} {:<12} {:<42} {:>8.1f} req/s  p50 {:.3f} ms  p99 {:.3f} ms  {} errors'.format(
+                          size, client.name, name, result['throughput'], result['p50_ms'],
+                          result['p99_ms'], result['errors']), file=sys.stderr)
+
+                clean_up(app, state)
+        finally:
+            http.close()
+
+    report = {'environment': environment(args.database),
+              'settings': {'requests': args.requests,
+                           'concurrency': args.concurrency,
+                           'seed': args.seed},
+              'results': results}
+
+    # sorted and indented, so that reports diff line by line
+    output = json.dumps(report, indent=2, sort_keys=True)
+
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        return 1 if regressions else 0
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,20 +2,70 @@ import os
 from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
 
-from models import setup_db, Question, Category
+from models import setup_db, database_path, Question
+from .categories import CategoryRegistry
+from .quiz import QuestionPool
+from .counts import QuestionCounts
+from .search import find_questions
+from .cache import (ResponseCache,
+                    cached_response)
+from .sessions import (MemoryQuizStore,
+                       SqliteQuizStore,
+                       new_session_id,
+                       shuffled)
+from .ingest import (BATCH_SIZE as INGEST_BATCH_SIZE,
+                     ingest,
+                     read_ndjson)
 
 QUESTIONS_PER_PAGE = 10
+CATEGORY_CACHE_TTL = 300
+QUESTION_POOL_TTL = 300
+RESPONSE_CACHE_SIZE = 512
+QUIZ_SESSION_TTL = 3600
+QUIZ_SESSION_LIMIT = 10000
 
 def create_app(test_config=None):
 
   app = Flask(__name__)
-  setup_db(app)
+  if test_config is not None:
+      app.config.from_mapping(test_config)
+  setup_db(app, app.config.get('DATABASE_PATH', database_path))
   CORS(app)
 
   cors = CORS(app, resources={r"*": {"origins": "*"}})
 
+  category_registry = CategoryRegistry(ttl=app.config.get('CATEGORY_CACHE_TTL',
+                                                          CATEGORY_CACHE_TTL))
+  app.extensions['category_registry'] = category_registry
+
+  question_pool = QuestionPool(ttl=app.config.get('QUESTION_POOL_TTL',
+                                                  QUESTION_POOL_TTL))
+  app.extensions['question_pool'] = question_pool
+
+  question_counts = QuestionCounts(ttl=app.config.get('QUESTION_POOL_TTL',
+                                                      QUESTION_POOL_TTL))
+  app.extensions['question_counts'] = question_counts
+
+  response_cache = ResponseCache(max_entries=app.config.get('RESPONSE_CACHE_SIZE',
+                                                            RESPONSE_CACHE_SIZE),
+                                 ttl=app.config.get('QUESTION_POOL_TTL',
+                                                    QUESTION_POOL_TTL))
+  app.extensions['response_cache'] = response_cache
+
+  # a SQLite file lets several workers share quiz sessions
+  quiz_session_db = app.config.get('QUIZ_SESSION_DB', os.environ.get('QUIZ_SESSION_DB'))
+  quiz_session_ttl = app.config.get('QUIZ_SESSION_TTL', QUIZ_SESSION_TTL)
+
+  if quiz_session_db:
+      quiz_sessions = SqliteQuizStore(quiz_session_db,
+                                      ttl=quiz_session_ttl)
+  else:
+      quiz_sessions = MemoryQuizStore(max_sessions=app.config.get('QUIZ_SESSION_LIMIT',
+                                                                  QUIZ_SESSION_LIMIT),
+                                      ttl=quiz_session_ttl)
+  app.extensions['quiz_sessions'] = quiz_sessions
+
   '''
   after_request decorator to set Access-Control-Allow
   '''
@@ -36,18 +86,15 @@ def create_app(test_config=None):
   '''
 
   @app.route('/categories')
+  @cached_response(response_cache)
   def get_categories():
 
-      categories = Category.query.all()
-
-      if len(categories) == 0:
+      if len(category_registry.categories()) == 0:
           abort(404)
 
-      formatted_categories = {category.id: category.type for category in categories}
-
-      return jsonify({'success': True,
-                      'categories': formatted_categories,
-                      'total_categories': len(categories)})
+      # serialized once per registry load
+      return app.response_class(category_registry.payload(),
+                                mimetype='application/json')
 
   '''
   an endpoint to handle GET requests for questions, 
@@ -56,42 +103,37 @@ def create_app(test_config=None):
   number of total questions, current category, categories. 
   '''
 
-  def paginate_questions(request, questions_list):
-
-      page = request.args.get('page', 1, type=int)
-
-      start = (page - 1) * QUESTIONS_PER_PAGE
-      end = start + QUESTIONS_PER_PAGE
-
-      questions = [question.format() for question in questions_list]
+  def paginate_questions(request, selection):
 
-      paginated_questions = questions[start:end]
+      '''
+      pages a (filtered) Question query in the database; only the
+      requested page is loaded and formatted
+      '''
 
-      return paginated_questions
-
-  def get_category_list():
+      page = request.args.get('page', 1, type=int)
 
-      categories = {}
+      if page < 1:
+          return []
 
-      for category in Category.query.all():
-          categories[category.id] = category.type
+      questions = selection.order_by(Question.id).limit(QUESTIONS_PER_PAGE).offset(
+          (page - 1) * QUESTIONS_PER_PAGE).all()
 
-      return categories
+      return [question.format() for question in questions]
 
   @app.route('/questions')
+  @cached_response(response_cache)
   def get_questions():
 
-      questions_list = Question.query.all()
       paginated_questions = paginate_questions(request,
-                                               questions_list)
+                                               Question.query)
 
       if len(paginated_questions) == 0:
           abort(404)
 
       return jsonify({'success': True,
                       'questions': paginated_questions,
-                      'total_questions': len(questions_list),
-                      'categories': get_category_list(),
+                      'total_questions': question_counts.total(),
+                      'categories': category_registry.categories(),
                       'current_category': None})
 
   '''
@@ -131,15 +173,9 @@ def create_app(test_config=None):
       difficulty = data.get('difficulty', '')
       category = data.get('category', '')
 
-      selection = Question.query.all()
-      total_questions = len(selection)
-      current_questions = paginate_questions(request, selection)
-
-      categories = Category.query.all()
-      categories_dict = {}
-
-      for cat in categories:
-          categories_dict[cat.id] = cat.type
+      current_questions = paginate_questions(request,
+                                             Question.query)
+      total_questions = question_counts.total()
 
       if ((question == '') or (answer == '') or (difficulty == '') or (category == '')):
           abort(422)
@@ -156,61 +192,104 @@ def create_app(test_config=None):
                           'message': 'Question successfully created!',
                           'questions': current_questions,
                           'total_questions': total_questions,
-                          'categories': categories_dict}), 201
+                          'categories': category_registry.categories()}), 201
 
       except Exception:
           abort(422)
 
+  '''
+  POST endpoint to create many questions at once, 
+  from a JSON array or an NDJSON body (Content-Type: application/x-ndjson). 
+  Invalid questions are skipped and reported by their position. 
+  '''
+
+  @app.route('/questions/bulk', methods=['POST'])
+  def create_questions_in_bulk():
+
+      if request.mimetype == 'application/x-ndjson':
+          # streamed line by line instead of parsing the whole body
+          records = read_ndjson(request.stream)
+      else:
+          records = request.get_json(silent=True)
+          if not isinstance(records, list):
+              abort(400)
+
+      result = ingest(records,
+                      set(category_registry.categories()),
+                      batch_size=app.config.get('INGEST_BATCH_SIZE', INGEST_BATCH_SIZE))
+
+      # partially loaded bodies are still 201; failed counts the skipped rows
+      return jsonify({'success': bool(result['inserted']) and not result['failed'],
+                      **result}), 201 if result['inserted'] else 422
+
   '''
   POST endpoint to get questions based on a search term. 
-  It return any questions for whom the search term 
-  is a substring of the question. 
+  It return the questions whose question or answer text has words 
+  starting with every word of the search term, best matches first, 
+  optionally within a category and/or difficulty, 
+  paginated (every 10 questions). 
   '''
 
   @app.route('/questions/search', methods=['POST'])
   def search_questions():
 
+      body = request.get_json(silent=True) or {}
+
       try:
-          search_term = request.json.get('searchTerm', None)
-          questions = Question.query.filter(Question.question.ilike('%{}%'.format(search_term))).all()
-          formatted_questions = [question.format() for question in questions]
-
-          if len(questions) == 0:
-              abort(404)  # resource not found
-          return jsonify({"success": True,
-                          "questions": formatted_questions,
-                          "total_questions": len(questions),
-                          "current_category": None})
-      except Exception as e:
-          print("Exception is: ", e)
-          abort(404)
+          category = body.get('category')
+          category = int(category) if category not in (None, '', 0) else None
+          difficulty = body.get('difficulty')
+          difficulty = int(difficulty) if difficulty not in (None, '') else None
+          page = int(body.get('page', 1))
+      except (TypeError, ValueError):
+          abort(400)
+
+      if page < 1:
+          abort(400)
+
+      questions, total_questions = find_questions(body.get('searchTerm', None),
+                                                  category=category,
+                                                  difficulty=difficulty,
+                                                  page=page,
+                                                  per_page=QUESTIONS_PER_PAGE)
+
+      if len(questions) == 0:
+          abort(404)  # resource not found
+
+      return jsonify({"success": True,
+                      "questions": questions,
+                      "total_questions": total_questions,
+                      "page": page,
+                      "current_category": category_registry.categories().get(category)})
 
   '''
   GET endpoint to get questions based on category. 
   '''
 
   @app.route('/categories/<int:id>/questions')
+  @cached_response(response_cache)
   def get_questions_by_category(id):
 
-      category = Category.query.filter_by(id=id).one_or_none()
+      category_type = category_registry.categories().get(id)
 
-      if (category is None):
+      if (category_type is None):
           abort(400)
 
-      selection = Question.query.filter_by(category=category.id).all()
-
-      paginated = paginate_questions(request, selection)
+      paginated = paginate_questions(request,
+                                     Question.query.filter_by(category=id))
 
       return jsonify({'success': True,
                       'questions': paginated,
-                      'total_questions': len(Question.query.all()),
-                      'current_category': category.type})
+                      'total_questions': question_counts.total(id),
+                      'current_category': category_type})
 
   '''
   POST endpoint to get questions to play the quiz. 
   This endpoint take category and previous question parameters 
   and return a random questions within the given category, 
   if provided, and that is not one of the previous questions. 
+  With adaptive set, num_correct (how many previous questions were 
+  answered correctly) steers the difficulty of the next question. 
   '''
 
   @app.route('/quizzes', methods=['POST'])
@@ -223,35 +302,107 @@ def create_app(test_config=None):
       if ((category is None) or (previous is None)):
           abort(400)
 
-      if (category['id'] == 0):
-          questions = Question.query.all() # load all questions if "ALL" option is selected
+      try:
+          category_id = int(category['id'])
+          previous = [int(question_id) for question_id in previous]
+          num_correct = int(body.get('num_correct', 0))
+      except (KeyError, TypeError, ValueError):
+          abort(400)
+
+      if body.get('adaptive'):
+          # half right until the first answer
+          accuracy = min(max(num_correct / len(previous), 0), 1) if previous else 0.5
+          draw = lambda: question_pool.draw_adaptive(category_id, previous, accuracy)
       else:
-          questions = Question.query.filter_by(category=category['id']).all()
+          draw = lambda: question_pool.draw(category_id, previous)
 
-      total = len(questions)
+      # id 0 is the "ALL" option
+      question_id = draw()
+      question = Question.query.get(question_id) if question_id is not None else None
 
-      def get_random_question():
-          return questions[random.randrange(0, len(questions), 1)]
+      if question_id is not None and question is None:
+          # deleted by another process since the pool was loaded
+          question_pool.invalidate()
+          question_id = draw()
+          question = Question.query.get(question_id) if question_id is not None else None
 
-      def check_if_used(question):
-          used = False
-          for q in previous:
-              if (q == question.id):
-                  used = True
-          return used
+      # when all questions have been asked, return without question
+      if question is None:
+          return jsonify({'success': True,
+                          'exhausted': True})
+
+      return jsonify({'success': True,
+                      'question': question.format()})
+
+  '''
+  quiz sessions: POST /quizzes/sessions starts a game in a category 
+  (id 0 for all) with the question order shuffled once; every 
+  POST /quizzes/sessions/<session_id>/next returns the next question 
+  until the game is exhausted. 
+  '''
+
+  @app.route('/quizzes/sessions', methods=['POST'])
+  def create_quiz_session():
+
+      body = request.get_json(silent=True) or {}
+
+      try:
+          category_id = int(body['quiz_category']['id'])
+      except (KeyError, TypeError, ValueError):
+          abort(400)
+
+      if category_id and category_id not in category_registry.categories():
+          abort(404)
+
+      session_id = new_session_id()
+      order = shuffled(question_pool.ids(category_id))
+      quiz_sessions.create(session_id, order)
+
+      return jsonify({'success': True,
+                      'session_id': session_id,
+                      'total_questions': len(order)}), 201
+
+  @app.route('/quizzes/sessions/<session_id>/next', methods=['POST'])
+  def next_quiz_question(session_id):
 
-      question = get_random_question()
+      question = None
 
-      while (check_if_used(question)):
-          question = get_random_question()
+      try:
+          # questions deleted since the game started are skipped
+          while question is None:
+              question_id = quiz_sessions.pop(session_id)
+              if question_id is None:
+                  break
+              question = Question.query.get(question_id)
+      except KeyError:
+          abort(404)
 
-          # when all questions have been asked, return without question (for <5 questions)
-          if (len(previous) == total):
-              return jsonify({'success': True})
+      if question is None:
+          return jsonify({'success': True,
+                          'exhausted': True})
 
       return jsonify({'success': True,
                       'question': question.format()})
 
+  @app.route('/quizzes/sessions/<session_id>', methods=['DELETE'])
+  def delete_quiz_session(session_id):
+
+      if not quiz_sessions.delete(session_id):
+          abort(404)
+
+      return jsonify({'success': True,
+                      'deleted': session_id})
+
+  '''
+  GET endpoint with the hit/miss statistics of the response cache. 
+  '''
+
+  @app.route('/cache/stats')
+  def get_cache_stats():
+
+      return jsonify({'success': True,
+                      **response_cache.stats()})
+
   '''
   error handlers for all expected errors
   '''
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request
+
+from .categories import category_changes
+from .quiz import question_changes
+
+'''
+data_version()
+    changes whenever a question or category insert, update or delete
+    commits in this process; part of every cache key, so entries cached
+    before a change are never looked up again and age out of the LRU
+'''
+
+def data_version():
+    return (question_changes(), category_changes())
+
+'''
+ResponseCache
+    serialized JSON bodies in LRU order, bounded by entry count and total
+    bytes; ttl bounds how long changes made by other processes go unseen
+'''
+
+class ResponseCache:
+
+  def __init__(self, max_entries=512, max_bytes=16 * 1024 * 1024, ttl=300):
+    self.max_entries = max_entries
+    self.max_bytes = max_bytes
+    self.ttl = ttl
+    self._entries = OrderedDict()
+    self._bytes = 0
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+
+      if entry is None or time.monotonic() - entry[1] > self.ttl:
+        self.misses += 1
+        return None
+
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return entry[0]
+
+  def set(self, key, body):
+    with self._lock:
+      if key in self._entries:
+        self._bytes -= len(self._entries.pop(key)[0])
+
+      self._entries[key] = (body, time.monotonic())
+      self._bytes += len(body)
+
+      while self._entries and (len(self._entries) > self.max_entries or
+                               self._bytes > self.max_bytes):
+        _, (evicted, _) = self._entries.popitem(last=False)
+        self._bytes -= len(evicted)
+        self.evictions += 1
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._bytes = 0
+
+  def stats(self):
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {'entries': len(self._entries),
+              'bytes': self._bytes,
+              'max_entries': self.max_entries,
+              'max_bytes': self.max_bytes,
+              'hits': self.hits,
+              'misses': self.misses,
+              'evictions': self.evictions,
+              'hit_ratio': self.hits / lookups if lookups else 0.0}
+
+'''
+cached_response(cache)
+    serves a GET view from cache, keyed by data version, endpoint, view
+    arguments and page; only 200 responses are stored
+'''
+
+def cached_response(cache):
+
+  def decorator(view):
+
+    @wraps(view)
+    def wrapper(**kwargs):
+      key = (data_version(),
+             request.endpoint,
+             tuple(sorted(kwargs.items())),
+             request.args.get('page', 1, type=int))
+
+      body = cache.get(key)
+
+      if body is None:
+        response = current_app.make_response(view(**kwargs))
+
+        if response.status_code != 200:
+          return response
+
+        body = response.get_data()
+        cache.set(key, body)
+
+      return current_app.response_class(body, mimetype='application/json')
+
+    return wrapper
+
+  return decorator
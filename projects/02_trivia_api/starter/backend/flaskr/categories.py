@@ -0,0 +1,72 @@
+import json
+import threading
+import time
+
+from models import Category
+from .changes import track_commits
+
+'''
+category changes committed through the ORM in this process; a registry
+loaded before the latest change reloads on its next use
+'''
+
+_changes = 0
+
+def _category_changed(*args):
+    global _changes
+    _changes += 1
+
+track_commits(Category, lambda kind, category: None, _category_changed)
+
+def category_changes():
+    return _changes
+
+'''
+CategoryRegistry
+    the id -> type map of all categories, loaded once and shared by the
+    endpoints; reloaded after ttl seconds, after a category changes, or
+    after invalidate()
+'''
+
+class CategoryRegistry:
+
+  def __init__(self, ttl=300):
+    self.ttl = ttl
+    self._lock = threading.Lock()
+    # (categories, payload, loaded at, changes seen), replaced as a whole
+    self._snapshot = None
+
+  def _fresh(self, snapshot):
+    return (snapshot is not None and
+            snapshot[3] == _changes and
+            time.monotonic() - snapshot[2] <= self.ttl)
+
+  def _current(self):
+    snapshot = self._snapshot
+
+    if self._fresh(snapshot):
+      return snapshot
+
+    with self._lock:
+      if not self._fresh(self._snapshot):
+        changes = _changes
+        categories = {category.id: category.type
+                      for category in Category.query.order_by(Category.id).all()}
+        payload = json.dumps({'success': True,
+                              'categories': categories,
+                              'total_categories': len(categories)})
+
+        self._snapshot = (categories, payload, time.monotonic(), changes)
+
+      return self._snapshot
+
+  def invalidate(self):
+    self._snapshot = None
+
+  def categories(self):
+    '''id -> type; shared between requests, so callers must not modify it'''
+    return self._current()[0]
+
+  def payload(self):
+    '''the complete GET /categories response body'''
+    return self._current()[1]
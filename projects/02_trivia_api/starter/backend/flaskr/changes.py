@@ -0,0 +1,64 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+'''
+committed ORM changes: collected when a session flushes and handed to
+their listeners only once it commits, so caches never hear of data that
+other connections can't see yet; rolled back changes are dropped
+'''
+
+PENDING = 'committed_changes'
+
+# (model, describe(kind, target), publish(change))
+_trackers = []
+
+def track_commits(model, describe, publish):
+    '''
+    publish(describe(kind, target)) for every committed insert, update or
+    delete of model; describe runs at flush time, while target is loaded
+    '''
+    _trackers.append((model, describe, publish))
+
+def _within(transaction, ancestor):
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+@event.listens_for(Session, 'after_flush')
+def _collect(session, flush_context):
+    pending = session.info.setdefault(PENDING, [])
+
+    for kind, targets in (('insert', session.new),
+                          ('update', session.dirty),
+                          ('delete', session.deleted)):
+        for target in targets:
+            if kind == 'update' and not session.is_modified(target):
+                continue
+            for model, describe, publish in _trackers:
+                if isinstance(target, model):
+                    pending.append((session.transaction, publish, describe(kind, target)))
+
+@event.listens_for(Session, 'after_commit')
+def _publish(session):
+    # a released SAVEPOINT is not committed yet
+    if session.transaction.nested:
+        return
+
+    for _, publish, change in session.info.pop(PENDING, ()):
+        publish(change)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard(session, previous_transaction):
+    pending = session.info.get(PENDING)
+
+    if pending:
+        pending[:] = [entry for entry in pending
+                      if not _within(entry[0], previous_transaction)]
+
+@event.listens_for(Session, 'after_transaction_end')
+def _forget(session, transaction):
+    # closed without a commit
+    if transaction.parent is None:
+        session.info.pop(PENDING, None)
@@ -0,0 +1,52 @@
+import threading
+import time
+from sqlalchemy import func
+
+from models import db, Question
+from .quiz import question_changes
+
+'''
+QuestionCounts
+    the number of questions per category from one GROUP BY, kept until
+    ttl seconds pass or a question changes in this process
+'''
+
+class QuestionCounts:
+
+  def __init__(self, ttl=300):
+    self.ttl = ttl
+    self._lock = threading.Lock()
+    # (category -> count, loaded at, changes seen)
+    self._snapshot = None
+
+  def _fresh(self, snapshot):
+    return (snapshot is not None and
+            snapshot[2] == question_changes() and
+            time.monotonic() - snapshot[1] <= self.ttl)
+
+  def _counts(self):
+    snapshot = self._snapshot
+
+    if self._fresh(snapshot):
+      return snapshot[0]
+
+    with self._lock:
+      if not self._fresh(self._snapshot):
+        changes = question_changes()
+        rows = db.session.query(Question.category,
+                                func.count(Question.id)).group_by(Question.category).all()
+
+        # None holds the overall total, uncategorized questions included
+        counts = {int(category): count for category, count in rows if category is not None}
+        counts[None] = sum(count for _, count in rows)
+
+        self._snapshot = (counts, time.monotonic(), changes)
+
+      return self._snapshot[0]
+
+  def invalidate(self):
+    self._snapshot = None
+
+  def total(self, category=None):
+    '''questions in the category, or in all categories for None'''
+    return self._counts().get(category, 0)
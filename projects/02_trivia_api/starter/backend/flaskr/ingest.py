@@ -0,0 +1,144 @@
+import json
+from itertools import islice
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Question
+from .quiz import question_changed
+
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+'''
+readers: one dict per question, without holding the whole input
+'''
+
+def read_ndjson(lines):
+    for line in lines:
+        if isinstance(line, bytes):
+            try:
+                line = line.decode('utf-8')
+            except UnicodeDecodeError as e:
+                yield {'_error': 'invalid UTF-8: {}'.format(e)}
+                continue
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                # reported by validate() like any other bad record
+                yield {'_error': 'invalid JSON: {}'.format(e)}
+
+def batched(records, size):
+    records = iter(records)
+    batch = list(islice(records, size))
+
+    while batch:
+        yield batch
+        batch = list(islice(records, size))
+
+'''
+validate(batch, categories)
+    checks a whole batch in one pass against the known category ids;
+    returns the insertable rows as (index, row) and the errors as
+    (index, message)
+'''
+
+def validate(batch, categories, offset=0):
+    rows, errors = [], []
+
+    for index, record in enumerate(batch, offset):
+        if not isinstance(record, dict):
+            errors.append((index, 'expected an object'))
+            continue
+        if '_error' in record:
+            errors.append((index, record['_error']))
+            continue
+
+        question = record.get('question')
+        answer = record.get('answer')
+
+        try:
+            difficulty = int(record.get('difficulty'))
+            category = int(record.get('category'))
+        except (TypeError, ValueError):
+            errors.append((index, 'difficulty and category must be integers'))
+            continue
+
+        if not isinstance(question, str) or not question.strip():
+            errors.append((index, 'question is required'))
+        elif not isinstance(answer, str) or not answer.strip():
+            errors.append((index, 'answer is required'))
+        elif '\x00' in question or '\x00' in answer:
+            errors.append((index, 'text must not contain NUL characters'))
+        elif not 1 <= difficulty <= 5:
+            errors.append((index, 'difficulty must be between 1 and 5'))
+        elif category not in categories:
+            errors.append((index, 'unknown category {}'.format(category)))
+        else:
+            rows.append((index, {'question': question.strip(),
+                                 'answer': answer.strip(),
+                                 'difficulty': difficulty,
+                                 'category': category}))
+
+    return rows, errors
+
+def _insert(rows):
+    '''
+    one executemany per batch; if the database rejects it, the rows are
+    retried one by one in savepoints so that only the bad ones fail
+    '''
+    table = Question.__table__
+
+    try:
+        db.session.execute(table.insert(), [row for _, row in rows])
+        db.session.commit()
+        return len(rows), []
+    except (SQLAlchemyError, ValueError):
+        db.session.rollback()
+
+    inserted, errors = 0, []
+
+    for index, row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert(), row)
+            inserted += 1
+        except (SQLAlchemyError, ValueError) as e:
+            errors.append((index, str(e.orig if hasattr(e, 'orig') else e).strip()))
+
+    db.session.commit()
+
+    return inserted, errors
+
+'''
+ingest(records, categories)
+    validates and inserts an iterable of question dicts in batches, one
+    transaction per batch; memory is bounded by batch_size
+'''
+
+def ingest(records, categories, batch_size=BATCH_SIZE, progress=None):
+    inserted, failed, errors = 0, 0, []
+    offset = 0
+
+    for batch in batched(records, batch_size):
+        rows, batch_errors = validate(batch, categories, offset)
+
+        if rows:
+            batch_inserted, insert_errors = _insert(rows)
+            inserted += batch_inserted
+            batch_errors += insert_errors
+
+            # committed, so caches have to see it even if a later batch fails
+            if batch_inserted:
+                question_changed()
+
+        failed += len(batch_errors)
+        errors += batch_errors[:MAX_REPORTED_ERRORS - len(errors)]
+        offset += len(batch)
+
+        if progress:
+            progress(offset, inserted, failed)
+
+    return {'inserted': inserted,
+            'failed': failed,
+            'errors': [{'index': index, 'error': message}
+                       for index, message in sorted(errors)]}
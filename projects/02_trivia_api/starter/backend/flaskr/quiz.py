@@ -0,0 +1,224 @@
+import math
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+from models import db, Question
+from .changes import track_commits
+
+'''
+question changes committed in this process; pools loaded before the
+latest change catch up on their next use. ORM inserts and deletes are
+logged with the question, so pools can replay them; everything else
+(updates, Core bulk writes, which have to call question_changed()
+themselves after committing) makes the pools reload
+'''
+
+CHANGE_LOG_SIZE = 1000
+
+_changes = 0
+# (change number, (kind, id, category, difficulty) or None)
+_log = deque(maxlen=CHANGE_LOG_SIZE)
+_log_lock = threading.Lock()
+
+def _record(change):
+    global _changes
+    with _log_lock:
+        _changes += 1
+        _log.append((_changes, change))
+
+def question_changed(*args):
+    _record(None)
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _describe(kind, question):
+    if kind == 'update':
+        return None
+    return (kind, question.id, _as_int(question.category), _as_int(question.difficulty))
+
+track_commits(Question, _describe, _record)
+
+def question_changes():
+    return _changes
+
+def changes_since(seen):
+    '''
+    (latest change number, the logged changes after seen); the changes
+    are None if one of them can't be replayed
+    '''
+    with _log_lock:
+        changes = [change for number, change in _log if number > seen]
+        complete = not _log or _log[0][0] <= seen + 1
+
+        return _changes, (changes if complete and None not in changes else None)
+
+ALL_CATEGORIES = 0
+MIN_DIFFICULTY = 1
+MAX_DIFFICULTY = 5
+
+'''
+QuestionPool
+    sorted question ids per category (0 for all of them), also split by
+    difficulty; loaded on first use, brought up to date from the change
+    log after questions are added or deleted, and reloaded after ttl
+    seconds or any other change
+'''
+
+class QuestionPool:
+
+  def __init__(self, ttl=300):
+    self.ttl = ttl
+    self._lock = threading.Lock()
+    # category -> (ids, difficulty -> ids, loaded at, changes seen)
+    self._pools = {}
+
+  def _expired(self, pool):
+    return time.monotonic() - pool[2] > self.ttl
+
+  def _load(self, category):
+    changes = _changes
+    query = db.session.query(Question.id, Question.difficulty)
+    if category != ALL_CATEGORIES:
+      query = query.filter(Question.category == category)
+
+    ids, by_difficulty = [], {}
+    for row in query.order_by(Question.id):
+      ids.append(row.id)
+      by_difficulty.setdefault(row.difficulty, []).append(row.id)
+
+    return (tuple(ids),
+            {difficulty: tuple(members) for difficulty, members in by_difficulty.items()},
+            time.monotonic(),
+            changes)
+
+  def _replay(self, category, pool):
+    '''pool with the logged inserts and deletes applied, or None'''
+    changes, replayed = changes_since(pool[3])
+
+    if replayed is None:
+      return None
+
+    # copied, the loaded tuples may be in use by other requests
+    ids = list(pool[0])
+    by_difficulty = {difficulty: list(members) for difficulty, members in pool[1].items()}
+
+    for kind, question_id, question_category, difficulty in replayed:
+      if category != ALL_CATEGORIES and question_category != category:
+        continue
+
+      if kind == 'insert':
+        _insert(ids, question_id)
+        _insert(by_difficulty.setdefault(difficulty, []), question_id)
+      else:
+        _remove(ids, question_id)
+        _remove(by_difficulty.get(difficulty, []), question_id)
+
+    return (tuple(ids),
+            {difficulty: tuple(members) for difficulty, members in by_difficulty.items() if members},
+            pool[2],
+            changes)
+
+  def _pool(self, category):
+    pool = self._pools.get(category)
+
+    if pool is not None and pool[3] == _changes and not self._expired(pool):
+      return pool
+
+    with self._lock:
+      pool = self._pools.get(category)
+
+      if pool is None or self._expired(pool):
+        pool = self._pools[category] = self._load(category)
+      elif pool[3] != _changes:
+        pool = self._pools[category] = self._replay(category, pool) or self._load(category)
+
+      return pool
+
+  def ids(self, category, difficulty=None):
+    pool = self._pool(category)
+
+    if difficulty is None:
+      return pool[0]
+    return pool[1].get(difficulty, ())
+
+  def invalidate(self):
+    self._pools = {}
+
+  def draw(self, category, previous):
+    '''
+    a random id from the category that is not in previous, or None when
+    every question has been asked; one draw, O(len(previous) * log n)
+    '''
+    return _draw(self.ids(category), set(previous))
+
+  def draw_adaptive(self, category, previous, accuracy):
+    '''
+    like draw(), but leaning towards the difficulty that matches the
+    player's accuracy (0 to 1): a difficulty is picked with weight
+    unused questions * e^-(distance from the target difficulty), then a
+    question of it
+    '''
+    by_difficulty = self._pool(category)[1]
+    previous = set(previous)
+    target = MIN_DIFFICULTY + accuracy * (MAX_DIFFICULTY - MIN_DIFFICULTY)
+
+    difficulties, weights = [], []
+    for difficulty, ids in by_difficulty.items():
+      if difficulty is None:
+        continue
+
+      remaining = len(ids) - len(_excluded(ids, previous))
+      if remaining > 0:
+        difficulties.append(difficulty)
+        weights.append(remaining * math.exp(-abs(difficulty - target)))
+
+    if not difficulties:
+      # only questions without a difficulty are left
+      return self.draw(category, previous)
+
+    difficulty = random.choices(difficulties, weights)[0]
+
+    return _draw(by_difficulty[difficulty], previous)
+
+def _insert(ids, question_id):
+    position = bisect_left(ids, question_id)
+    if position == len(ids) or ids[position] != question_id:
+        ids.insert(position, question_id)
+
+def _remove(ids, question_id):
+    position = bisect_left(ids, question_id)
+    if position < len(ids) and ids[position] == question_id:
+        del ids[position]
+
+def _excluded(ids, previous):
+    # positions of the previous ids that are actually in ids; an id that
+    # isn't sorts next to one that may be, so only an exact hit counts
+    positions = set()
+    for question_id in previous:
+        position = bisect_left(ids, question_id)
+        if position < len(ids) and ids[position] == question_id:
+            positions.add(position)
+    return sorted(positions)
+
+def _draw(ids, previous):
+    excluded = _excluded(ids, previous)
+    remaining = len(ids) - len(excluded)
+
+    if remaining <= 0:
+        return None
+
+    # the index-th unused id: step over every excluded position at or
+    # before it
+    index = random.randrange(remaining)
+    for position in excluded:
+        if position <= index:
+            index += 1
+
+    return ids[index]
@@ -0,0 +1,54 @@
+import re
+from sqlalchemy import func
+
+from models import db, Question
+
+SEARCH_CONFIG = 'simple'
+
+'''
+question_document()
+    the weighted question + answer document; must match the expression
+    of ix_questions_search in models.py
+'''
+
+def question_document():
+    return (func.setweight(func.to_tsvector(SEARCH_CONFIG, func.coalesce(Question.question, '')), 'A').op('||')(
+            func.setweight(func.to_tsvector(SEARCH_CONFIG, func.coalesce(Question.answer, '')), 'B')))
+
+def _prefix_query(search_term):
+    # every word of the term has to prefix-match a word of the question
+    # or answer, e.g. "cass cl" finds "Cassius Clay"
+    words = re.findall(r'\w+', (search_term or '').lower())
+
+    return ' & '.join(word + ':*' for word in words)
+
+'''
+find_questions()
+    ranked page of questions matching search_term, optionally limited
+    to a category and/or difficulty; returns (questions, total)
+'''
+
+def find_questions(search_term, category=None, difficulty=None, page=1, per_page=10):
+
+    filters, ranking = [], []
+    terms = _prefix_query(search_term)
+
+    if terms and db.session.get_bind().dialect.name == 'postgresql':
+        query = func.to_tsquery(SEARCH_CONFIG, terms)
+        filters.append(question_document().op('@@')(query))
+        ranking.append(func.ts_rank(question_document(), query).desc())
+    elif terms:
+        filters.append(Question.question.ilike('%{}%'.format(search_term)) |
+                       Question.answer.ilike('%{}%'.format(search_term)))
+
+    if category is not None:
+        filters.append(Question.category == category)
+    if difficulty is not None:
+        filters.append(Question.difficulty == difficulty)
+
+    total = db.session.query(func.count(Question.id)).filter(*filters).scalar()
+
+    questions = Question.query.filter(*filters).order_by(*ranking, Question.id).limit(
+        per_page).offset((page - 1) * per_page).all()
+
+    return [question.format() for question in questions], total
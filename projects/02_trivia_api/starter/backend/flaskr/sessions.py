@@ -0,0 +1,167 @@
+import random
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+'''
+quiz sessions: the question ids of one game, shuffled once when the game
+starts; every turn pops the next id instead of resending and rescanning
+previous_questions
+'''
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+def shuffled(ids):
+    order = list(ids)
+    random.shuffle(order)
+    return order
+
+'''
+MemoryQuizStore
+    sessions of this process only, at most max_sessions of them (least
+    recently used are dropped first), each expiring ttl seconds after
+    its last turn
+'''
+
+class MemoryQuizStore:
+
+  def __init__(self, max_sessions=10000, ttl=3600):
+    self.max_sessions = max_sessions
+    self.ttl = ttl
+    self._sessions = OrderedDict()
+    self._lock = threading.Lock()
+
+  def create(self, session_id, order):
+    with self._lock:
+      # popped from the end
+      self._sessions[session_id] = [time.monotonic() + self.ttl, order[::-1]]
+
+      while len(self._sessions) > self.max_sessions:
+        self._sessions.popitem(last=False)
+
+  def pop(self, session_id):
+    '''the next question id, None once exhausted; KeyError if unknown or expired'''
+    with self._lock:
+      session = self._sessions.get(session_id)
+
+      if session is None or session[0] < time.monotonic():
+        self._sessions.pop(session_id, None)
+        raise KeyError(session_id)
+
+      session[0] = time.monotonic() + self.ttl
+      self._sessions.move_to_end(session_id)
+
+      return session[1].pop() if session[1] else None
+
+  def delete(self, session_id):
+    with self._lock:
+      return self._sessions.pop(session_id, None) is not None
+
+'''
+SqliteQuizStore
+    sessions in a SQLite file shared by every worker on the host; the
+    order is one row per position, so a turn is a primary key lookup and
+    an update of the session's cursor
+'''
+
+class SqliteQuizStore:
+
+  def __init__(self, path, ttl=3600):
+    self.path = path
+    self.ttl = ttl
+    self._local = threading.local()
+
+    self._connection().executescript('''
+      CREATE TABLE IF NOT EXISTS quiz_sessions (
+        id TEXT PRIMARY KEY,
+        next_position INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        expires REAL NOT NULL
+      );
+      CREATE TABLE IF NOT EXISTS quiz_session_questions (
+        session_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        question_id INTEGER NOT NULL,
+        PRIMARY KEY (session_id, position)
+      ) WITHOUT ROWID;
+      CREATE INDEX IF NOT EXISTS ix_quiz_sessions_expires ON quiz_sessions (expires);
+    ''')
+
+  def _connection(self):
+    # sqlite3 connections must stay on the thread that opened them
+    connection = getattr(self._local, 'connection', None)
+
+    if connection is None:
+      connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+      connection.execute('PRAGMA journal_mode=WAL')
+      connection.execute('PRAGMA synchronous=NORMAL')
+      self._local.connection = connection
+
+    return connection
+
+  def _transaction(self):
+    return _Transaction(self._connection())
+
+  def create(self, session_id, order):
+    now = time.time()
+
+    with self._transaction() as connection:
+      self._expire(connection, now)
+      connection.execute('INSERT INTO quiz_sessions VALUES (?, 0, ?, ?)',
+                         (session_id, len(order), now + self.ttl))
+      connection.executemany('INSERT INTO quiz_session_questions VALUES (?, ?, ?)',
+                             [(session_id, position, question_id)
+                              for position, question_id in enumerate(order)])
+
+  def pop(self, session_id):
+    '''the next question id, None once exhausted; KeyError if unknown or expired'''
+    now = time.time()
+
+    with self._transaction() as connection:
+      session = connection.execute('SELECT next_position, size FROM quiz_sessions '
+                                   'WHERE id = ? AND expires >= ?',
+                                   (session_id, now)).fetchone()
+
+      if session is None:
+        raise KeyError(session_id)
+
+      position, size = session
+      connection.execute('UPDATE quiz_sessions SET next_position = ?, expires = ? WHERE id = ?',
+                         (min(position + 1, size), now + self.ttl, session_id))
+
+      if position >= size:
+        return None
+
+      return connection.execute('SELECT question_id FROM quiz_session_questions '
+                                'WHERE session_id = ? AND position = ?',
+                                (session_id, position)).fetchone()[0]
+
+  def delete(self, session_id):
+    with self._transaction() as connection:
+      connection.execute('DELETE FROM quiz_session_questions WHERE session_id = ?', (session_id,))
+      return connection.execute('DELETE FROM quiz_sessions WHERE id = ?',
+                                (session_id,)).rowcount > 0
+
+  def _expire(self, connection, now):
+    expired = [row[0] for row in connection.execute('SELECT id FROM quiz_sessions WHERE expires < ?',
+                                                    (now,))]
+    for session_id in expired:
+      connection.execute('DELETE FROM quiz_session_questions WHERE session_id = ?', (session_id,))
+    connection.execute('DELETE FROM quiz_sessions WHERE expires < ?', (now,))
+
+class _Transaction:
+
+  '''BEGIN IMMEDIATE ... COMMIT, so two workers never pop the same turn'''
+
+  def __init__(self, connection):
+    self.connection = connection
+
+  def __enter__(self):
+    self.connection.execute('BEGIN IMMEDIATE')
+    return self.connection
+
+  def __exit__(self, kind, value, traceback):
+    self.connection.execute('COMMIT' if kind is None else 'ROLLBACK')
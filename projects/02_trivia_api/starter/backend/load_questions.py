@@ -0,0 +1,57 @@
+import argparse
+import csv
+import sys
+import time
+
+from flaskr import create_app
+from flaskr.ingest import (BATCH_SIZE,
+                           ingest,
+                           read_ndjson)
+from models import database_path
+
+'''
+streams questions from an NDJSON or CSV file (columns question, answer,
+difficulty, category) into the database, one transaction per batch:
+
+    python load_questions.py questions.ndjson --batch-size 1000
+'''
+
+def read_records(path):
+    source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+
+    with source:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(source)
+        else:
+            yield from read_ndjson(source)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-load trivia questions.')
+    parser.add_argument('path', help='NDJSON or CSV file, - for NDJSON on stdin')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--database', default=database_path)
+    args = parser.parse_args(argv)
+
+    app = create_app({'DATABASE_PATH': args.database})
+
+    started = time.monotonic()
+
+    def progress(read, inserted, failed):
+        rate = read / max(time.monotonic() - started, 1e-6)
+        print('{} read, {} inserted, {} failed, {:.0f} rows/sec'.format(read, inserted, failed, rate),
+              file=sys.stderr)
+
+    with app.app_context():
+        categories = set(app.extensions['category_registry'].categories())
+        result = ingest(read_records(args.path),
+                        categories,
+                        batch_size=args.batch_size,
+                        progress=progress)
+
+    for error in result['errors']:
+        print('record {index}: {error}'.format(**error), file=sys.stderr)
+
+    return 1 if result['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
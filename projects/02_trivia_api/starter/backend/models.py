@@ -1,5 +1,6 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, Index, create_engine, event
+from sqlalchemy.pool import StaticPool
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -8,6 +9,44 @@ database_path = "postgres://{}/{}".format('localhost:5432', database_name)
 
 db = SQLAlchemy()
 
+'''
+schema changes applied on top of trivia.psql, in order; each one is
+idempotent, so they simply run on every start (create_all() skips
+tables that already exist)
+'''
+MIGRATIONS = (
+  ('ix_questions_category_id',
+   'CREATE INDEX IF NOT EXISTS ix_questions_category_id ON questions (category, id)',
+   None),
+  # must match flaskr/search.py question_document()
+  ('ix_questions_search',
+   "CREATE INDEX IF NOT EXISTS ix_questions_search ON questions USING gin "
+   "((setweight(to_tsvector('simple', coalesce(question, '')), 'A') || "
+   "setweight(to_tsvector('simple', coalesce(answer, '')), 'B')))",
+   'postgresql'),
+)
+
+def migrate_db():
+    with db.engine.begin() as connection:
+        for name, statement, dialect in MIGRATIONS:
+            if dialect is None or dialect == connection.dialect.name:
+                connection.execute(statement)
+
+'''
+pysqlite begins and commits transactions on its own, which breaks
+SAVEPOINT; let SQLAlchemy emit BEGIN instead. Only for the in-memory
+(test) database: on a file, the BEGIN of a request's first SELECT
+would lock out other writers until the request ends
+'''
+def enable_sqlite_savepoints(engine):
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        connection.execute('BEGIN')
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
@@ -15,9 +54,22 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    in_memory = database_path in ('sqlite://', 'sqlite:///:memory:')
+    if database_path.startswith('postgres'):
+        # bulk inserts become multi-row INSERT ... VALUES statements
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {'executemany_mode': 'values'}
+    elif in_memory:
+        # an in-memory database lives as long as its one connection
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {'poolclass': StaticPool,
+                                                   'connect_args': {'check_same_thread': False}}
+    else:
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {}
     db.app = app
     db.init_app(app)
+    if in_memory:
+        enable_sqlite_savepoints(db.get_engine(app))
     db.create_all()
+    migrate_db()
 
 '''
 Question
@@ -25,11 +77,12 @@ Question
 '''
 class Question(db.Model):  
   __tablename__ = 'questions'
+  __table_args__ = (Index('ix_questions_category_id', 'category', 'id'),)
 
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  category = Column(Integer)
   difficulty = Column(Integer)
 
   def __init__(self, question, answer, category, difficulty):
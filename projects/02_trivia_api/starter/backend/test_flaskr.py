@@ -1,37 +1,141 @@
 import os
+import re
 import unittest
 import json
-from flask_sqlalchemy import SQLAlchemy
+import tempfile
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr.cache import data_version
+from flaskr.quiz import question_changed
+from flaskr.sessions import SqliteQuizStore
+from models import db, Question, Category
+
+# e.g. postgresql://localhost:5432/trivia_test; an in-memory SQLite
+# database by default, so the suite needs no server
+DATABASE_PATH = os.environ.get('TRIVIA_TEST_DATABASE', 'sqlite://')
+# word prefix matching and ranking; other databases fall back to ILIKE
+FULL_TEXT_SEARCH = DATABASE_PATH.startswith('postgres')
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trivia.psql')
+
+def read_fixture(path):
+
+    """The rows of the COPY blocks of a pg_dump file, per table."""
+
+    tables, rows = {}, None
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+
+            if rows is not None:
+                if line == '\\.':
+                    rows = None
+                else:
+                    rows.append([None if value == '\\N' else value
+                                 for value in line.split('\t')])
+                continue
+
+            match = re.match(r'COPY public\.(\w+) \(([^)]*)\) FROM stdin;', line)
+            if match:
+                rows = []
+                tables[match.group(1)] = ([column.strip() for column in match.group(2).split(',')],
+                                          rows)
+
+    return tables
+
+def load_fixture(connection, path=FIXTURE):
+
+    """Bulk-loads the categories and questions of trivia.psql."""
+
+    tables = read_fixture(path)
+
+    for name in ('categories', 'questions'):
+        columns, rows = tables[name]
+        connection.execute(db.Model.metadata.tables[name].insert(),
+                           [dict(zip(columns, row)) for row in rows])
+
+        if connection.dialect.name == 'postgresql':
+            connection.execute("SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                               "(SELECT max(id) FROM {0}))".format(name))
 
 class TriviaTestCase(unittest.TestCase):
 
     """This class represents the trivia test case"""
 
+    @classmethod
+    def setUpClass(cls):
+
+        """Create the app and schema once and load the fixture if the database is empty."""
+
+        cls.app = create_app({'DATABASE_PATH': DATABASE_PATH,
+                              'TESTING': True})
+
+        with db.engine.begin() as connection:
+            if not connection.execute(func.count(Category.__table__.c.id)).scalar():
+                load_fixture(connection)
+
     def setUp(self):
 
-        """Define test variables and initialize app."""
+        """Run the test inside a transaction that tearDown rolls back."""
 
-        self.app = create_app()
         self.client = self.app.test_client
-        self.database_name = "trivia_test"
-        self.database_path = "postgresql://{}/{}".format('localhost:5432',
-                                                         self.database_name)
-        setup_db(self.app,
-                 self.database_path)
 
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-    
+        self.connection = db.engine.connect()
+        self.transaction = self.connection.begin()
+        self.savepoint = self.connection.begin_nested()
+
+        # sessions bound to the connection only open subtransactions of
+        # it; the SAVEPOINT stands in for the commits and rollbacks
+        self.session = db.create_scoped_session(options={'bind': self.connection,
+                                                         'binds': {}})
+
+        def committed(session):
+            if session.bind is self.connection:
+                session.info['committed'] = session.transaction
+
+        def restart_savepoint(session, transaction):
+            if session.bind is not self.connection or transaction.parent is not None:
+                return
+
+            # keep what was committed, drop what was not, like the
+            # database would
+            if self.savepoint.is_active:
+                if session.info.pop('committed', None) is transaction:
+                    self.savepoint.commit()
+                else:
+                    self.savepoint.rollback()
+
+            self.savepoint = self.connection.begin_nested()
+
+        # on Session itself: listeners on the scoped session's own class
+        # would hide the app's Session listeners for the same events
+        self.listeners = (('after_commit', committed),
+                          ('after_transaction_end', restart_savepoint))
+        for name, listener in self.listeners:
+            event.listen(Session, name, listener)
+
+        self._session = db.session
+        db.session = self.session
+
     def tearDown(self):
-        """Executed after reach test"""
-        pass
+
+        """Roll back everything the test wrote and drop what the caches saw of it."""
+
+        self.session.remove()
+        db.session = self._session
+
+        for name, listener in self.listeners:
+            event.remove(Session, name, listener)
+
+        self.savepoint.rollback()
+        self.transaction.rollback()
+        self.connection.close()
+
+        question_changed()
+        self.app.extensions['category_registry'].invalidate()
+        self.app.extensions['response_cache'].clear()
 
     # https://knowledge.udacity.com/questions/422782
 
@@ -46,6 +150,44 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['categories'])
         self.assertEqual(data['total_categories'], 6)
 
+    def test_categories_served_from_registry(self):
+
+        registry = self.app.extensions['category_registry']
+
+        first = self.client().get('/categories')
+        categories = registry.categories()
+
+        # a second request reuses the loaded map and serialized body
+        second = self.client().get('/categories')
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.data, second.data)
+        self.assertIs(registry.categories(), categories)
+
+        registry.invalidate()
+
+        self.assertIsNot(registry.categories(), categories)
+        self.assertEqual(registry.categories(), categories)
+
+    def test_registry_reloads_after_category_change(self):
+
+        registry = self.app.extensions['category_registry']
+        total = len(registry.categories())
+
+        with self.app.app_context():
+            category = Category(type='Mock category')
+            db.session.add(category)
+            db.session.commit()
+
+            try:
+                data = json.loads(self.client().get('/categories').data)
+                self.assertEqual(data['total_categories'], total + 1)
+            finally:
+                db.session.delete(category)
+                db.session.commit()
+
+        self.assertEqual(len(registry.categories()), total)
+
     def test_404_sent_requesting_non_existing_category(self):
 
         response = self.client().get('/categories/7777')
@@ -68,6 +210,52 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(len(data['questions']))
         self.assertTrue(len(data['categories']))
 
+    def test_get_questions_second_page(self):
+
+        first = json.loads(self.client().get('/questions?page=1').data)
+        second = json.loads(self.client().get('/questions?page=2').data)
+
+        first_ids = [question['id'] for question in first['questions']]
+        second_ids = [question['id'] for question in second['questions']]
+
+        # pages are ordered by id and do not overlap
+        self.assertEqual(len(first_ids), 10)
+        self.assertEqual(first_ids, sorted(first_ids))
+        self.assertLess(first_ids[-1], second_ids[0])
+        self.assertEqual(first['total_questions'], Question.query.count())
+        self.assertEqual(second['total_questions'], first['total_questions'])
+
+    def test_question_pages_served_from_cache(self):
+
+        cache = self.app.extensions['response_cache']
+
+        first = self.client().get('/questions?page=2')
+        hits = cache.stats()['hits']
+        second = self.client().get('/questions?page=2')
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(cache.stats()['hits'], hits + 1)
+
+    def test_cached_pages_follow_new_questions(self):
+
+        total = json.loads(self.client().get('/questions').data)['total_questions']
+
+        question = Question(question='This is a mock cached question.',
+                            answer='This is a mock answer.',
+                            difficulty=1,
+                            category=1)
+        question.insert()
+
+        try:
+            data = json.loads(self.client().get('/questions').data)
+            self.assertEqual(data['total_questions'], total + 1)
+        finally:
+            question.delete()
+
+        data = json.loads(self.client().get('/questions').data)
+        self.assertEqual(data['total_questions'], total)
+
     def test_404_request_beyond_valid_page(self):
 
         # invalid page data and then load response
@@ -84,7 +272,7 @@ class TriviaTestCase(unittest.TestCase):
         question = Question(question='This is a mock test question.',
                             answer='This is a mock test answer.',
                             difficulty=1,
-                            category='1')
+                            category=1)
 
         question.insert()
 
@@ -127,6 +315,95 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertEqual(data['message'], 'Question successfully created!')
 
+    def test_bulk_create_questions_reports_bad_rows(self):
+
+        total = Question.query.count()
+
+        response = self.client().post('/questions/bulk',
+                                      json=[{'question': 'Bulk question one',
+                                             'answer': 'One',
+                                             'difficulty': 1,
+                                             'category': 1},
+                                            {'question': '',
+                                             'answer': 'Missing question',
+                                             'difficulty': 1,
+                                             'category': 1},
+                                            {'question': 'Bulk question two',
+                                             'answer': 'Two',
+                                             'difficulty': 2,
+                                             'category': 666}])
+
+        data = json.loads(response.data)
+
+        try:
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(data['success'], False)
+            self.assertEqual(data['inserted'], 1)
+            self.assertEqual(data['failed'], 2)
+            self.assertEqual([error['index'] for error in data['errors']], [1, 2])
+            self.assertEqual(Question.query.count(), total + 1)
+        finally:
+            Question.query.filter(Question.question.like('Bulk question%')).delete(synchronize_session=False)
+            Question.query.session.commit()
+
+    def test_bulk_create_questions_from_ndjson(self):
+
+        body = '\n'.join(json.dumps({'question': 'Bulk NDJSON question {}'.format(number),
+                                     'answer': str(number),
+                                     'difficulty': 3,
+                                     'category': 2}) for number in range(5)) + '\nnot json\n'
+
+        response = self.client().post('/questions/bulk',
+                                      data=body,
+                                      content_type='application/x-ndjson')
+
+        data = json.loads(response.data)
+
+        try:
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(data['inserted'], 5)
+            self.assertEqual(data['errors'][0]['index'], 5)
+        finally:
+            Question.query.filter(Question.question.like('Bulk NDJSON%')).delete(synchronize_session=False)
+            Question.query.session.commit()
+
+    def test_bulk_create_reports_undecodable_lines(self):
+
+        total = json.loads(self.client().get('/questions').data)['total_questions']
+
+        body = b''.join(json.dumps({'question': 'Bulk encoded question {}'.format(number),
+                                    'answer': str(number),
+                                    'difficulty': 3,
+                                    'category': 2}).encode('utf-8') + b'\n'
+                        for number in range(4)) + b'\xff\xfe\n'
+
+        response = self.client().post('/questions/bulk',
+                                      data=body,
+                                      content_type='application/x-ndjson')
+
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(data['inserted'], 4)
+        self.assertEqual(data['errors'][0]['index'], 4)
+        self.assertIn('UTF-8', data['errors'][0]['error'])
+
+        response = self.client().get('/questions')
+        self.assertEqual(json.loads(response.data)['total_questions'], total + 4)
+
+    def test_422_if_bulk_create_has_no_valid_question(self):
+
+        response = self.client().post('/questions/bulk',
+                                      json=[{'question': 'No answer',
+                                             'difficulty': 1,
+                                             'category': 1}])
+
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['errors'][0]['error'], 'answer is required')
+
     def test_422_if_question_creation_fails(self):
 
         # empty question data for failed delete request
@@ -166,6 +443,60 @@ class TriviaTestCase(unittest.TestCase):
         self.assertIsNotNone(data['questions'])
         self.assertIsNotNone(data['total_questions'])
 
+    @unittest.skipUnless(FULL_TEXT_SEARCH, 'full-text search needs PostgreSQL')
+    def test_search_matches_answers_and_word_prefixes(self):
+
+        response = self.client().post('/questions/search',
+                                      json={'searchTerm': 'muham'})
+
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['total_questions'], 1)
+        self.assertEqual(data['questions'][0]['answer'], 'Muhammad Ali')
+
+    def test_search_filtered_by_category_and_difficulty(self):
+
+        response = self.client().post('/questions/search',
+                                      json={'searchTerm': 'the',
+                                            'category': 1,
+                                            'difficulty': 4})
+
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['current_category'], 'Science')
+        self.assertEqual(data['total_questions'], len(data['questions']))
+        for question in data['questions']:
+            self.assertEqual(question['category'], 1)
+            self.assertEqual(question['difficulty'], 4)
+
+    @unittest.skipUnless(FULL_TEXT_SEARCH, 'full-text search needs PostgreSQL')
+    def test_search_ranks_question_matches_first(self):
+
+        # "Tom" is in the question of one entry and the answer of another
+        response = self.client().post('/questions/search',
+                                      json={'searchTerm': 'tom'})
+
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['total_questions'], 2)
+        self.assertIn('Tom', data['questions'][0]['question'])
+        self.assertIn('Tom', data['questions'][1]['answer'])
+
+    def test_search_rejects_pages_before_the_first(self):
+
+        for page in (0, -3):
+            response = self.client().post('/questions/search',
+                                          json={'searchTerm': 'the',
+                                                'page': page})
+
+            data = json.loads(response.data)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(data['success'], False)
+
     def test_search_term_not_found(self):
 
         # a search request for the term that is not in the database and process response
@@ -189,6 +520,36 @@ class TriviaTestCase(unittest.TestCase):
         self.assertNotEqual(len(data['questions']), 0)
         self.assertEqual(data['current_category'], 'Science')
 
+    def test_total_questions_by_category(self):
+
+        response = self.client().get('/categories/1/questions')
+
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['total_questions'],
+                         Question.query.filter(Question.category == 1).count())
+        self.assertTrue(all(question['category'] == 1 for question in data['questions']))
+
+    def test_category_total_follows_new_and_deleted_questions(self):
+
+        total = json.loads(self.client().get('/categories/6/questions').data)['total_questions']
+
+        question = Question(question='This is a mock sports question.',
+                            answer='This is a mock answer.',
+                            difficulty=1,
+                            category=6)
+        question.insert()
+
+        try:
+            data = json.loads(self.client().get('/categories/6/questions').data)
+            self.assertEqual(data['total_questions'], total + 1)
+        finally:
+            question.delete()
+
+        data = json.loads(self.client().get('/categories/6/questions').data)
+        self.assertEqual(data['total_questions'], total)
+
     def test_if_questions_by_category_fails(self):
 
         # send an invalid category ID of 666, which does not exist
@@ -228,6 +589,159 @@ class TriviaTestCase(unittest.TestCase):
         self.assertNotEqual(data['question']['id'], 5)
         self.assertNotEqual(data['question']['id'], 9)
 
+    def test_quiz_exhausted_category(self):
+
+        science = [question.id for question in
+                   Question.query.filter(Question.category == 1).all()]
+
+        response = self.client().post('/quizzes',
+                                      json={'previous_questions': science,
+                                            'quiz_category': {'type': 'Science',
+                                                              'id': '1'}})
+
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['exhausted'], True)
+        self.assertNotIn('question', data)
+
+    def test_quiz_draw_skips_previous_questions(self):
+
+        pool = self.app.extensions['question_pool']
+
+        with self.app.app_context():
+            ids = pool.ids(0)
+            previous = ids[::2]
+
+            # every draw lands on one of the unused ids
+            drawn = {pool.draw(0, previous) for _ in range(200)}
+
+            self.assertEqual(drawn, set(ids) - set(previous))
+            self.assertIsNone(pool.draw(0, ids))
+
+    def test_quiz_draw_ignores_previous_ids_outside_the_pool(self):
+
+        pool = self.app.extensions['question_pool']
+
+        with self.app.app_context():
+            for category in (0, 4):
+                ids = pool.ids(category)
+                asked = set(ids[1::2])
+                # deleted questions or ones of other categories, each sorting
+                # right before an asked id
+                previous = asked | ({question_id - 1 for question_id in asked} - set(ids))
+
+                drawn = {pool.draw(category, previous) for _ in range(200)}
+
+                self.assertEqual(drawn, set(ids) - asked)
+                self.assertIsNone(pool.draw(category, set(ids) | previous))
+
+    def test_adaptive_quiz_follows_accuracy(self):
+
+        pool = self.app.extensions['question_pool']
+
+        with self.app.app_context():
+            def mean_difficulty(accuracy):
+                drawn = [pool.draw_adaptive(0, [], accuracy) for _ in range(300)]
+                return sum(Question.query.get(question_id).difficulty
+                           for question_id in drawn) / len(drawn)
+
+            self.assertGreater(mean_difficulty(1), mean_difficulty(0))
+
+            # nothing left once every question has been asked
+            ids = pool.ids(0)
+            self.assertIsNone(pool.draw_adaptive(0, ids, 1))
+
+        response = self.client().post('/quizzes',
+                                      json={'previous_questions': [5, 9],
+                                            'quiz_category': {'type': 'ALL', 'id': 0},
+                                            'adaptive': True,
+                                            'num_correct': 2})
+
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(data['question']['id'], (5, 9))
+
+    def test_adaptive_quiz_draws_every_unused_question(self):
+
+        pool = self.app.extensions['question_pool']
+
+        with self.app.app_context():
+            # asked questions of every difficulty, interleaved by id
+            previous = set(pool.ids(0)[::2])
+            target = pool.ids(0, 4)
+
+            # 0.75 aims at difficulty 4
+            drawn = {pool.draw_adaptive(0, previous, 0.75) for _ in range(500)}
+
+            self.assertFalse(drawn & previous)
+            self.assertEqual(drawn & set(target), set(target) - previous)
+
+    def test_question_pool_replays_inserts_and_deletes(self):
+
+        pool = self.app.extensions['question_pool']
+
+        with self.app.app_context():
+            pool.ids(1)
+            loaded_at = pool._pools[1][2]
+
+            question = Question(question='This is a mock hard question.',
+                                answer='Hard',
+                                category=1,
+                                difficulty=5)
+            question.insert()
+
+            self.assertIn(question.id, pool.ids(1))
+            self.assertIn(question.id, pool.ids(1, 5))
+            self.assertNotIn(question.id, pool.ids(2))
+
+            question.delete()
+
+            self.assertNotIn(question.id, pool.ids(1))
+            self.assertNotIn(question.id, pool.ids(1, 5))
+
+            # brought up to date without reloading
+            self.assertEqual(pool._pools[1][2], loaded_at)
+
+    def test_changes_published_only_on_commit(self):
+
+        pool = self.app.extensions['question_pool']
+
+        with self.app.app_context():
+            version = data_version()
+
+            question = Question(question='This is a mock uncommitted question.',
+                                answer='Never',
+                                category=1,
+                                difficulty=1)
+            db.session.add(question)
+            db.session.flush()
+            question_id = question.id
+
+            # flushed, and even a released SAVEPOINT, is not committed yet
+            with db.session.begin_nested():
+                db.session.add(Question(question='This is a mock nested question.',
+                                        answer='Later',
+                                        category=1,
+                                        difficulty=1))
+            self.assertEqual(data_version(), version)
+
+            db.session.rollback()
+
+            self.assertEqual(data_version(), version)
+            self.assertNotIn(question_id, pool.ids(1))
+
+            question = Question(question='This is a mock committed question.',
+                                answer='Now',
+                                category=1,
+                                difficulty=1)
+            question.insert()
+
+            self.assertNotEqual(data_version(), version)
+            self.assertIn(question.id, pool.ids(1))
+
     def test_no_data_to_play_quiz(self):
 
         # Process the response from the request without sending data
@@ -240,6 +754,60 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'Bad request')
 
+    def test_quiz_session_asks_every_question_once(self):
+
+        response = self.client().post('/quizzes/sessions',
+                                      json={'quiz_category': {'type': 'Science',
+                                                              'id': 1}})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 201)
+        session_id = data['session_id']
+        total_questions = data['total_questions']
+        self.assertTrue(total_questions)
+
+        asked = []
+        for _ in range(total_questions):
+            data = json.loads(self.client().post(
+                '/quizzes/sessions/{}/next'.format(session_id)).data)
+            self.assertEqual(data['question']['category'], 1)
+            asked.append(data['question']['id'])
+
+        self.assertEqual(len(set(asked)), total_questions)
+
+        data = json.loads(self.client().post(
+            '/quizzes/sessions/{}/next'.format(session_id)).data)
+        self.assertEqual(data['exhausted'], True)
+
+        response = self.client().delete('/quizzes/sessions/{}'.format(session_id))
+        self.assertEqual(response.status_code, 200)
+
+    def test_404_unknown_quiz_session(self):
+
+        response = self.client().post('/quizzes/sessions/unknown/next')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_sqlite_quiz_sessions_shared_between_stores(self):
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'quiz_sessions.db')
+            store = SqliteQuizStore(path)
+            other = SqliteQuizStore(path)
+
+            store.create('game', [3, 1, 2])
+
+            self.assertEqual(store.pop('game'), 3)
+            self.assertEqual(other.pop('game'), 1)
+            self.assertEqual(store.pop('game'), 2)
+            self.assertIsNone(other.pop('game'))
+
+            self.assertTrue(other.delete('game'))
+            with self.assertRaises(KeyError):
+                store.pop('game')
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file